@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import socket
 import time
 import io
 
@@ -19,9 +20,10 @@ logger = logging.getLogger("a2s")
 
 async def request_async(address, timeout, encoding, a2s_proto):
     conn = await A2SStreamAsync.create(address, timeout)
-    response = await request_async_impl(conn, encoding, a2s_proto)
-    conn.close()
-    return response
+    try:
+        return await request_async_impl(conn, encoding, a2s_proto)
+    finally:
+        conn.close()
 
 async def request_async_impl(conn, encoding, a2s_proto, challenge=0, retries=0, ping=None):
     send_time = time.monotonic()
@@ -135,3 +137,67 @@ class A2SStreamAsync:
 
     def close(self):
         self.transport.close()
+
+
+class A2SSharedSocket(asyncio.DatagramProtocol):
+    """
+    One unconnected UDP socket shared by many concurrent queries. Replies are
+    routed to the per-address A2SProtocol by source address, so a query costs a
+    sendto/recvfrom pair instead of its own socket, connect and close.
+    """
+    RECV_BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__(self):
+        self.transport = None
+        self.routes = {}
+
+    @classmethod
+    async def create(cls):
+        loop = asyncio.get_running_loop()
+        _, shared = await loop.create_datagram_endpoint(
+            cls, local_addr=("0.0.0.0", 0))
+        return shared
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        try:
+            # Replies arrive in bursts; a larger buffer avoids kernel drops
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECV_BUFFER_SIZE)
+        except OSError:
+            pass
+
+    def datagram_received(self, packet, addr):
+        protocol = self.routes.get(addr[:2])
+        if protocol is not None:
+            protocol.datagram_received(packet, addr)
+
+    def error_received(self, exc):
+        # Unconnected sockets cannot attribute ICMP errors to a query;
+        # the affected query simply times out.
+        logger.debug("Shared socket error: %r", exc)
+
+    def stream(self, address, timeout):
+        return A2SSharedStream(self, address, timeout)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class A2SSharedStream(A2SStreamAsync):
+    """A2SStreamAsync equivalent that sends and receives through an A2SSharedSocket."""
+    def __init__(self, shared, address, timeout):
+        self.shared = shared
+        self.address = address
+        self.timeout = timeout
+        self.protocol = A2SProtocol()
+        shared.routes[address] = self.protocol
+
+    def send(self, payload):
+        self.shared.transport.sendto(HEADER_SIMPLE + payload, self.address)
+
+    def close(self):
+        if self.shared.routes.get(self.address) is self.protocol:
+            del self.shared.routes[self.address]
+
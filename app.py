@@ -5,6 +5,7 @@ import logging
 import logging.handlers
 import mimetypes
 import numpy as np
+import orjson
 from flask import Flask, request
 from flask.json.provider import DefaultJSONProvider
 from waitress import serve
@@ -122,7 +123,29 @@ class NumpyJSONProvider(DefaultJSONProvider):
             return o.tolist()
         return super().default(o)
 
-app.json = NumpyJSONProvider(app)
+# orjson-backed variant: numpy values are encoded natively, and datetimes are
+# passed through to default() so they keep Flask's HTTP-date format.
+class OrjsonJSONProvider(NumpyJSONProvider):
+    sort_keys = False
+
+    def _orjson_dumps(self, obj):
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+
+    def dumps(self, obj, **kwargs):
+        return self._orjson_dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson_dumps(obj), mimetype=self.mimetype)
+
+app.json = OrjsonJSONProvider(app)
 
 if __name__ == '__main__':
     logging.info("Starting up...")
@@ -1,25 +1,30 @@
 import os
 import duckdb
+import hashlib
 import time
 import threading
 import logging
-import shutil
 import re
 import pandas as pd
 import numpy as np
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from utils import get_color, get_country
 
+try:
+    import pyarrow  # noqa: F401  (optional: enables the Arrow fetch path)
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(BASE_DIR, "sourcemapstats.duckdb")
-DB_REPLICA_FILE = os.path.join(BASE_DIR, "sourcemapstats_replica.duckdb")
 RAW_FILE = os.path.join(BASE_DIR, "output.csv") # For migration only
 
 ReaderTimeFormat = "%Y-%m-%d-%H:%M:%S"
-CACHE_EXPIRY_SECONDS = 300
-CHART_WORKERS = 4
-query_executor = ThreadPoolExecutor(max_workers=CHART_WORKERS)
+CHART_CACHE_MAX_ENTRIES = 128
+CHART_CACHE_TTL_SECONDS = 600
+GLOBAL_TOTALS_CACHE_MAX_ENTRIES = 16
 
 def _parse_datetime(value):
     if not isinstance(value, str):
@@ -35,8 +40,54 @@ def _regex_filter_pattern(values):
         return None
     return '(?i)' + '|'.join(safe_tokens)
 
+def _parse_server_filter(server_filter):
+    """Return (ip, port) for an 'IP:PORT' filter, or None for 'ALL'/invalid input."""
+    if not server_filter or not isinstance(server_filter, str) or server_filter.upper() == 'ALL':
+        return None
+    try:
+        ip_str, port_str = server_filter.split(':', 1)
+        ip_str = ip_str.strip()
+        port_val = int(port_str.strip())
+    except Exception:
+        return None
+    if ip_str and port_val >= 0:
+        return ip_str, port_val
+    return None
+
+def _fetch_df(result):
+    """
+    Materialize a DuckDB result as a pandas DataFrame. With pyarrow installed the
+    result goes through Arrow, whose buffers are handed to pandas and released as
+    they are consumed instead of being copied column by column.
+    """
+    if HAS_PYARROW:
+        return result.to_arrow_table().to_pandas(split_blocks=True, self_destruct=True)
+    return result.df()
+
+def _fetch_columns(result):
+    """
+    Materialize a DuckDB result column-wise as Python lists, without building
+    the per-row tuples fetchall() returns. Goes through Arrow when available.
+    """
+    if HAS_PYARROW:
+        return [col.to_pylist() for col in result.to_arrow_table().columns]
+    rows = result.fetchall()
+    if not rows:
+        return [[] for _ in result.description]
+    return [list(col) for col in zip(*rows)]
+
+def _literal_filter_tokens(values):
+    return tuple(s.lower()[:50] for s in values or [] if isinstance(s, str) and s)
+
 # ─── data cache ───────────────────────────────────────────────────────────────
-g_chart_data_cache = {}
+# Entries stay valid until the data changes; the generation is bumped whenever
+# a new snapshot is detected, so stale keys simply age out of the LRU. Entries
+# older than CHART_CACHE_TTL_SECONDS are also dropped, so a stalled scanner
+# does not pin up to CHART_CACHE_MAX_ENTRIES payloads indefinitely.
+g_chart_data_cache = OrderedDict()
+# Unfiltered per-server totals for a window (the global server ranking)
+g_global_server_totals_cache = OrderedDict()
+g_cache_generation = 0
 g_known_server_names = {} # (ip, port) -> name
 
 # ─── served data cache (decoupled from DB) ────────────────────────────────────
@@ -47,7 +98,51 @@ g_served_data = {
     'default_chart_data': None,  
 }
 g_served_lock = threading.RLock() 
-g_replica_lock = threading.RLock() 
+# Single-writer lock: ingestion, cooldown/name saves and maintenance take it so
+# writes never interleave. Chart reads run on their own cursors without it.
+g_db_lock = threading.RLock()
+
+# Snapshots queued by record_snapshot, written in one batch by write_samples
+_pending_snaps = []
+_pending_snaps_lock = threading.Lock()
+
+# ─── shared connection ────────────────────────────────────────────────────────
+DB_THREADS = max(1, min(8, os.cpu_count() or 1))
+DB_MEMORY_LIMIT = os.getenv('DUCKDB_MEMORY_LIMIT', '2GB')
+
+_db_con = None
+_db_con_path = None
+_db_con_lock = threading.Lock()
+
+def _cursor():
+    """
+    Return a cursor on the process-wide connection to DB_FILE.
+    The connection is opened lazily (and reopened if DB_FILE changes) so the
+    buffer pool and catalog stay warm between calls. Each caller gets its own
+    cursor, which is safe to use from its thread and cheap to close.
+    """
+    global _db_con, _db_con_path
+    with _db_con_lock:
+        if _db_con is None or _db_con_path != DB_FILE:
+            if _db_con is not None:
+                _db_con.close()
+            _db_con = duckdb.connect(DB_FILE)
+            _db_con.execute(f"SET threads TO {DB_THREADS}")
+            _db_con.execute(f"SET memory_limit = '{DB_MEMORY_LIMIT}'")
+            _db_con_path = DB_FILE
+        return _db_con.cursor()
+
+def _close_connection_locked():
+    global _db_con, _db_con_path
+    if _db_con is not None:
+        _db_con.close()
+    _db_con = None
+    _db_con_path = None
+
+def close_connection():
+    """Close the shared connection (e.g. before the DB file is swapped out)."""
+    with _db_con_lock:
+        _close_connection_locked()
 
 DEFAULT_CHART_PARAMS = {
     'days_to_show': 7,
@@ -234,9 +329,7 @@ def init_db(db_path=DB_FILE):
     except Exception as e:
         logging.error(f"Failed to initialize DuckDB: {e}")
     
-    # Always sync replica on startup to ensure schema changes propagate
     if os.path.exists(db_path) and db_path == DB_FILE:
-        update_replica_db()
         load_server_names_from_db()
 
 def rebuild_database():
@@ -256,12 +349,16 @@ def rebuild_database():
     logging.info("Rebuilding database to reclaim space...")
 
     try:
-        with g_replica_lock:
+        # Holding _db_con_lock until the swap is done keeps _cursor() from
+        # reopening the old file while it is attached and renamed.
+        with g_db_lock, _db_con_lock:
+            _close_connection_locked()
+
             # Initialize schema in new DB using the common init function
             init_db(NEW_DB)
 
             with duckdb.connect(NEW_DB) as con_new:
-                # Attach old DB to read from it. This must be serialized with chart reads.
+                # Attach old DB to read from it
                 con_new.execute(f"ATTACH '{DB_FILE}' AS old_db")
 
                 logging.info("Copying tables...")
@@ -299,9 +396,6 @@ def rebuild_database():
 
             logging.info(f"Database rebuild complete. Old size: {os.path.getsize(BACKUP_DB) / 1024 / 1024:.2f}MB, New size: {os.path.getsize(DB_FILE) / 1024 / 1024:.2f}MB")
 
-            # Sync replica immediately
-            update_replica_db()
-
     except Exception as e:
         logging.error(f"Rebuild failed: {e}")
         # Cleanup
@@ -313,60 +407,28 @@ def maintenance():
     """Run VACUUM and CHECKPOINT to reclaim disk space."""
     try:
         logging.info("Starting database maintenance (VACUUM)...")
-        with g_replica_lock:
-            with duckdb.connect(DB_FILE) as con:
+        with g_db_lock:
+            with _cursor() as con:
                 con.execute("CHECKPOINT")
                 con.execute("VACUUM")
         logging.info("Database maintenance complete.")
-        update_replica_db()
     except Exception as e:
         logging.error(f"Database maintenance failed: {e}")
 
 def load_server_names_from_db():
     try:
-        with duckdb.connect(DB_FILE) as con:
-            rows = con.execute("SELECT ip, port, name FROM server_names").fetchall()
-            for r in rows:
-                g_known_server_names[(r[0], r[1])] = r[2]
+        with _cursor() as con:
+            ips, ports, names = _fetch_columns(con.execute("SELECT ip, port, name FROM server_names"))
+            g_known_server_names.update(zip(zip(ips, ports), names))
         logging.info(f"Loaded {len(g_known_server_names)} server names into cache.")
     except Exception as e:
         logging.warning(f"Failed to load server names cache: {e}")
 
-def update_replica_db():
-    try:
-        if os.path.exists(DB_FILE):
-            # Synchronization: Prevent updating while reader is active
-            # If a long chart query is running, this will block until it finishes.
-            copy_start = time.time()
-            db_size_mb = os.path.getsize(DB_FILE) / 1024 / 1024
-            with g_replica_lock:
-                lock_wait = time.time() - copy_start
-                file_copy_start = time.time()
-                shutil.copy2(DB_FILE, DB_REPLICA_FILE)
-                file_copy_duration = time.time() - file_copy_start
-                total_duration = time.time() - copy_start
-                logging.info(
-                    "Replica DB updated in %.2fs (copy=%.2fs, lock_wait=%.2fs, size=%.2fMB).",
-                    total_duration,
-                    file_copy_duration,
-                    lock_wait,
-                    db_size_mb,
-                )
-                return {
-                    'total': total_duration,
-                    'copy': file_copy_duration,
-                    'lock_wait': lock_wait,
-                    'size_mb': db_size_mb,
-                }
-    except Exception as e:
-        logging.warning(f"Failed to update replica DB: {e}")
-    return None
-
 def load_cooldowns_from_db():
     cooldowns = {}
     MAX_TIMEOUT_CAP = 5.0
     try:
-        with duckdb.connect(DB_FILE) as con:
+        with _cursor() as con:
             rows = con.execute(
                 "SELECT ip, port, timeout, failures, skip_until FROM server_cooldowns"
             ).fetchall()
@@ -386,29 +448,27 @@ def save_cooldowns_to_db(cooldowns):
     if not cooldowns:
         return
     try:
-        with g_replica_lock:
-            with duckdb.connect(DB_FILE) as con:
+        with g_db_lock:
+            with _cursor() as con:
                 _save_cooldowns_to_db_locked(con, cooldowns)
     except Exception as e:
         logging.debug(f"Could not save cooldowns to DB: {e}")
 
 def _save_cooldowns_to_db_locked(con, cooldowns):
-    now = datetime.now()
-    data = [
-        {
-            'ip': ip,
-            'port': port,
-            'timeout': d['timeout'],
-            'failures': d['failures'],
-            'skip_until': d['skip_until'],
-            'updated_at': now
-        }
-        for (ip, port), d in cooldowns.items()
-    ]
-    if not data:
+    if not cooldowns:
         return
 
-    df = pd.DataFrame(data)
+    # Built column by column; pandas would otherwise infer a schema per record
+    keys = list(cooldowns)
+    values = list(cooldowns.values())
+    df = pd.DataFrame({
+        'ip': [ip for ip, _ in keys],
+        'port': [port for _, port in keys],
+        'timeout': [d['timeout'] for d in values],
+        'failures': [d['failures'] for d in values],
+        'skip_until': [d['skip_until'] for d in values],
+        'updated_at': datetime.now(),
+    })
     con.execute(
         """
         INSERT OR REPLACE INTO server_cooldowns 
@@ -442,8 +502,8 @@ def save_server_names_to_db(rows):
         return
 
     try:
-        with g_replica_lock:
-            with duckdb.connect(DB_FILE) as con:
+        with g_db_lock:
+            with _cursor() as con:
                 _save_server_names_to_db_locked(con, server_updates)
     except Exception as e:
         logging.error(f"Failed to update server names in DuckDB: {e}")
@@ -459,27 +519,51 @@ def _save_server_names_to_db_locked(con, server_updates):
     logging.info(f"Updated names for {len(server_updates)} servers.")
 
 def record_snapshot(snapshot_id, snapshot_dt_str):
+    """Queue a snapshot row; it is inserted together with the next write_samples batch."""
     try:
-        with g_replica_lock:
-            with duckdb.connect(DB_FILE) as con:
-                _record_snapshot_locked(con, snapshot_id, snapshot_dt_str)
+        ts = _parse_datetime(snapshot_dt_str)
     except Exception as e:
         logging.error(f"Failed to record snapshot: {e}")
+        return
+    with _pending_snaps_lock:
+        _pending_snaps.append((snapshot_id, ts))
 
-def _record_snapshot_locked(con, snapshot_id, snapshot_dt_str):
-    ts = _parse_datetime(snapshot_dt_str)
-    con.execute(
-        "INSERT OR IGNORE INTO snaps (guid, timestamp) VALUES (?, ?)",
-        [snapshot_id, ts]
-    )
+def flush_snapshots():
+    try:
+        with g_db_lock:
+            with _cursor() as con:
+                _flush_snapshots_locked(con)
+    except Exception as e:
+        logging.error(f"Failed to record snapshot: {e}")
+
+def _flush_snapshots_locked(con):
+    with _pending_snaps_lock:
+        batch = list(_pending_snaps)
+        _pending_snaps.clear()
+    if not batch:
+        return 0
+
+    try:
+        df = pd.DataFrame(batch, columns=['guid', 'timestamp'])
+        con.register('snaps_batch', df)
+        con.execute("INSERT OR IGNORE INTO snaps (guid, timestamp) SELECT guid, timestamp FROM snaps_batch")
+        con.unregister('snaps_batch')
+    except Exception:
+        # Put the batch back so the next flush retries it
+        with _pending_snaps_lock:
+            _pending_snaps[:0] = batch
+        raise
+    return len(batch)
 
 def write_samples(rows):
     if not rows:
+        flush_snapshots()
         return
 
     total_start = time.time()
     parse_start = time.time()
     prepared_rows = []
+    countries = {}
     for row in rows:
         try:
             ip = row[0]
@@ -489,13 +573,16 @@ def write_samples(rows):
             ts_raw = row[4]
             ts = _parse_datetime(ts_raw)
             snapshot_id = row[6] if len(row) > 6 else None
-            country_code = get_country(ip)
+            country_code = countries.get(ip)
+            if country_code is None:
+                country_code = countries[ip] = get_country(ip)
             prepared_rows.append((ip, port, map_name, players, ts, country_code, snapshot_id))
         except Exception as e:
             logging.debug(f"Skipping row due to parse error: {row} ({e})")
     parse_duration = time.time() - parse_start
 
     if not prepared_rows:
+        flush_snapshots()
         logging.info(
             "[DB] write_samples skipped: input_rows=%d parsed_rows=0 parse=%.4fs",
             len(rows),
@@ -509,10 +596,15 @@ def write_samples(rows):
         }
 
     try:
-        with g_replica_lock:
-            with duckdb.connect(DB_FILE) as con:
+        with g_db_lock:
+            with _cursor() as con:
                 db_start = time.time()
 
+                # Snapshots must exist before samples can be joined to them
+                snaps_start = time.time()
+                _flush_snapshots_locked(con)
+                snaps_duration = time.time() - snaps_start
+
                 df_start = time.time()
                 df = pd.DataFrame(
                     prepared_rows,
@@ -521,60 +613,57 @@ def write_samples(rows):
                 con.register('raw_samples_df', df)
                 df_duration = time.time() - df_start
 
-                maps_start = time.time()
-                con.execute("INSERT OR IGNORE INTO maps (name) SELECT DISTINCT map FROM raw_samples_df")
-                maps_duration = time.time() - maps_start
+                # Dimension upserts, facts and rollups land atomically in one transaction
+                con.begin()
+                try:
+                    maps_start = time.time()
+                    con.execute("INSERT INTO maps (name) SELECT DISTINCT map FROM raw_samples_df ON CONFLICT DO NOTHING")
+                    maps_duration = time.time() - maps_start
 
-                servers_start = time.time()
-                con.execute("""
-                    INSERT OR IGNORE INTO servers (ip, port, country_code)
-                    SELECT ip, port, max(country_code)
-                    FROM raw_samples_df
-                    GROUP BY ip, port
-                """)
-                servers_duration = time.time() - servers_start
+                    servers_start = time.time()
+                    con.execute("""
+                        INSERT INTO servers (ip, port, country_code)
+                        SELECT ip, port, max(country_code)
+                        FROM raw_samples_df
+                        GROUP BY ip, port
+                        ON CONFLICT DO NOTHING
+                    """)
+                    servers_duration = time.time() - servers_start
 
-                samples_start = time.time()
-                con.execute("""
-                    INSERT INTO samples_v3 (snapshot_id, server_id, map_id, players)
-                    SELECT 
-                        sn.id, s.id, m.id, t.players
-                    FROM raw_samples_df t
-                    JOIN snaps sn ON t.guid = sn.guid
-                    JOIN servers s ON t.ip = s.ip AND t.port = s.port
-                    JOIN maps m ON t.map = m.name
-                """)
-                samples_duration = time.time() - samples_start
-
-                rollups_start = time.time()
-                con.execute("""
-                    CREATE TEMPORARY TABLE rollup_delta AS
-                    SELECT
-                        time_bucket(INTERVAL '2 hours', sn.timestamp) AS bucket,
-                        s.id AS server_id,
-                        m.id AS map_id,
-                        SUM(t.players)::BIGINT AS players
-                    FROM raw_samples_df t
-                    JOIN snaps sn ON t.guid = sn.guid
-                    JOIN servers s ON t.ip = s.ip AND t.port = s.port
-                    JOIN maps m ON t.map = m.name
-                    GROUP BY 1, 2, 3
-                """)
-                con.execute("""
-                    INSERT OR REPLACE INTO sample_rollups_2h (bucket, server_id, map_id, players)
-                    SELECT
-                        d.bucket,
-                        d.server_id,
-                        d.map_id,
-                        d.players + COALESCE(r.players, 0)
-                    FROM rollup_delta d
-                    LEFT JOIN sample_rollups_2h r
-                        ON r.bucket = d.bucket
-                        AND r.server_id = d.server_id
-                        AND r.map_id = d.map_id
-                """)
-                con.execute("DROP TABLE rollup_delta")
-                rollups_duration = time.time() - rollups_start
+                    samples_start = time.time()
+                    con.execute("""
+                        INSERT INTO samples_v3 (snapshot_id, server_id, map_id, players)
+                        SELECT 
+                            sn.id, s.id, m.id, t.players
+                        FROM raw_samples_df t
+                        JOIN snaps sn ON t.guid = sn.guid
+                        JOIN servers s ON t.ip = s.ip AND t.port = s.port
+                        JOIN maps m ON t.map = m.name
+                    """)
+                    samples_duration = time.time() - samples_start
+
+                    # Merge the batch's 2h sums into existing rollup rows in place
+                    rollups_start = time.time()
+                    con.execute("""
+                        INSERT INTO sample_rollups_2h (bucket, server_id, map_id, players)
+                        SELECT
+                            time_bucket(INTERVAL '2 hours', sn.timestamp) AS bucket,
+                            s.id AS server_id,
+                            m.id AS map_id,
+                            SUM(t.players)::BIGINT AS players
+                        FROM raw_samples_df t
+                        JOIN snaps sn ON t.guid = sn.guid
+                        JOIN servers s ON t.ip = s.ip AND t.port = s.port
+                        JOIN maps m ON t.map = m.name
+                        GROUP BY 1, 2, 3
+                        ON CONFLICT (bucket, server_id, map_id)
+                        DO UPDATE SET players = sample_rollups_2h.players + EXCLUDED.players
+                    """)
+                    rollups_duration = time.time() - rollups_start
+                    con.commit()
+                except Exception:
+                    con.rollback()
+                    raise
 
                 unregister_start = time.time()
                 con.unregister('raw_samples_df')
@@ -582,10 +671,11 @@ def write_samples(rows):
                 db_duration = time.time() - db_start
 
                 logging.info(
-                    "[DB] write_samples timings: input_rows=%d parsed_rows=%d parse=%.4fs df=%.4fs maps=%.4fs servers=%.4fs samples=%.4fs rollups=%.4fs unregister=%.4fs db=%.4fs total=%.4fs",
+                    "[DB] write_samples timings: input_rows=%d parsed_rows=%d parse=%.4fs snaps=%.4fs df=%.4fs maps=%.4fs servers=%.4fs samples=%.4fs rollups=%.4fs unregister=%.4fs db=%.4fs total=%.4fs",
                     len(rows),
                     len(prepared_rows),
                     parse_duration,
+                    snaps_duration,
                     df_duration,
                     maps_duration,
                     servers_duration,
@@ -599,6 +689,7 @@ def write_samples(rows):
                     'input_rows': len(rows),
                     'parsed_rows': len(prepared_rows),
                     'parse': parse_duration,
+                    'snaps': snaps_duration,
                     'df': df_duration,
                     'maps': maps_duration,
                     'servers': servers_duration,
@@ -621,31 +712,42 @@ def get_date_range():
     with g_served_lock:
         return g_served_data.get('date_range', {'min_date': None, 'max_date': None})
 
+def _expire_chart_cache_locked(now):
+    # At most CHART_CACHE_MAX_ENTRIES entries, so a full scan is cheap
+    expired = [k for k, entry in g_chart_data_cache.items() if now - entry['timestamp'] >= CHART_CACHE_TTL_SECONDS]
+    for k in expired:
+        del g_chart_data_cache[k]
+
 def _update_served_cache_from_db():
+    global g_cache_generation
     freshness = None
     date_range = {'min_date': None, 'max_date': None}
     
     try:
-        with g_replica_lock:
-            with duckdb.connect(DB_FILE, read_only=True) as con:
-                row = con.execute("SELECT max(timestamp) FROM snaps").fetchone()
-                latest = row[0] if row else None
-                if latest:
-                    latest_dt = _parse_datetime(latest)
-                    freshness = latest_dt.strftime(ReaderTimeFormat)
-                
-                row = con.execute("SELECT min(timestamp), max(timestamp) FROM snaps").fetchone()
-                if row and row[0] is not None and row[1] is not None:
-                    min_dt, max_dt = _parse_datetime(row[0]), _parse_datetime(row[1])
-                    date_range = {'min_date': min_dt.strftime('%Y-%m-%d'), 'max_date': max_dt.strftime('%Y-%m-%d')}
+        with _cursor() as con:
+            row = con.execute("SELECT max(timestamp) FROM snaps").fetchone()
+            latest = row[0] if row else None
+            if latest:
+                latest_dt = _parse_datetime(latest)
+                freshness = latest_dt.strftime(ReaderTimeFormat)
+            
+            row = con.execute("SELECT min(timestamp), max(timestamp) FROM snaps").fetchone()
+            if row and row[0] is not None and row[1] is not None:
+                min_dt, max_dt = _parse_datetime(row[0]), _parse_datetime(row[1])
+                date_range = {'min_date': min_dt.strftime('%Y-%m-%d'), 'max_date': max_dt.strftime('%Y-%m-%d')}
     except Exception as e:
         logging.debug(f"Failed to update served cache: {e}")
     
     with g_served_lock:
+        if freshness != g_served_data.get('freshness'):
+            g_cache_generation += 1
+            g_chart_data_cache.clear()
+            g_global_server_totals_cache.clear()
+        else:
+            _expire_chart_cache_locked(time.time())
         g_served_data['freshness'] = freshness
         g_served_data['date_range'] = date_range
         g_served_data['last_updated'] = time.time()
-        g_chart_data_cache.clear()
     
     logging.debug(f"Served cache updated: freshness={freshness}")
 
@@ -679,56 +781,94 @@ def refresh_served_cache():
     _update_served_cache_from_db()
     _precompute_default_chart_data()
 
-def get_chart_data(start_date_str, days_to_show, only_maps_containing, maps_to_show, percision, color_intensity, bias_exponent, top_servers=10, append_maps_containing=None, server_filter=None, only_servers_containing=None):
-    cache_key = (
+def _apply_chart_colors(data, color_intensity):
+    """
+    Return a copy of cached chart data with dataset colors for the given intensity.
+    Datasets carry their palette slot in '_color'; fixed-color series ('Other') have none.
+    """
+    result = dict(data)
+    for key, fill_alpha in (('datasets', None), ('totalPlayersServerDatasets', 0.5)):
+        if key not in data:
+            continue
+        colored = []
+        for ds in data[key]:
+            ds = dict(ds)
+            slot = ds.pop('_color', None)
+            if slot is not None:
+                color = get_color(slot[0], slot[1], color_intensity)
+                if fill_alpha is None:
+                    ds['backgroundColor'] = color
+                    ds['borderColor'] = color.replace('rgb', 'rgba').replace(')', ', 1)')
+                else:
+                    ds['backgroundColor'] = color.replace('rgb', 'rgba').replace(')', f', {fill_alpha})')
+                    ds['borderColor'] = color
+            colored.append(ds)
+        result[key] = colored
+    return result
+
+def _chart_cache_key(start_date_str, days_to_show, only_maps_containing, maps_to_show, percision, top_servers, append_maps_containing, server_filter, only_servers_containing):
+    # Only data-affecting params key the cache; colors are applied per request
+    # (bias_exponent is accepted for API compatibility but does not affect the output).
+    with g_served_lock:
+        generation = g_cache_generation
+    return (
+        generation,
         start_date_str,
         days_to_show,
         tuple(only_maps_containing),
         maps_to_show,
         percision,
-        color_intensity,
-        bias_exponent,
         top_servers,
         tuple(append_maps_containing or []),
         server_filter or 'ALL',
         tuple(only_servers_containing or [])
     )
 
-    cached_result = g_chart_data_cache.get(cache_key)
-    if cached_result and (time.time() - cached_result['timestamp']) < CACHE_EXPIRY_SECONDS:
+def get_chart_etag(start_date_str, days_to_show, only_maps_containing, maps_to_show, percision, color_intensity, bias_exponent, top_servers=10, append_maps_containing=None, server_filter=None, only_servers_containing=None):
+    """
+    Validator for the chart response with the given params. It changes whenever
+    new data is served (cache generation) or any output-affecting param changes,
+    and is cheap enough to check before the chart is built or serialized.
+    """
+    key = _chart_cache_key(start_date_str, days_to_show, only_maps_containing, maps_to_show, percision, top_servers, append_maps_containing, server_filter, only_servers_containing)
+    return hashlib.blake2b(repr(key + (color_intensity,)).encode(), digest_size=16).hexdigest()
+
+def get_chart_data(start_date_str, days_to_show, only_maps_containing, maps_to_show, percision, color_intensity, bias_exponent, top_servers=10, append_maps_containing=None, server_filter=None, only_servers_containing=None):
+    cache_key = _chart_cache_key(start_date_str, days_to_show, only_maps_containing, maps_to_show, percision, top_servers, append_maps_containing, server_filter, only_servers_containing)
+
+    with g_served_lock:
+        cached_result = g_chart_data_cache.get(cache_key)
+        if cached_result and time.time() - cached_result['timestamp'] >= CHART_CACHE_TTL_SECONDS:
+            del g_chart_data_cache[cache_key]
+            cached_result = None
+        if cached_result:
+            g_chart_data_cache.move_to_end(cache_key)
+    if cached_result:
         logging.debug("Returning cached chart data.")
-        return cached_result['data']
+        return _apply_chart_colors(cached_result['data'], color_intensity)
 
-    future = query_executor.submit(
-        _get_chart_data_worker,
+    # Runs on the calling request thread; waitress already provides the concurrency.
+    data = _get_chart_data_worker(
         start_date_str,
         days_to_show,
         only_maps_containing,
         maps_to_show,
         percision,
-        color_intensity,
-        bias_exponent,
         top_servers,
         append_maps_containing,
         server_filter,
         only_servers_containing,
         cache_key
     )
-    return future.result()
+    return _apply_chart_colors(data, color_intensity)
 
-def _get_chart_data_worker(*args, **kwargs):
-    # Wrapper to enforce locking without re-indenting the massive body
-    with g_replica_lock:
-        return _get_chart_data_worker_impl(*args, **kwargs)
-
-def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containing, maps_to_show, percision, color_intensity, bias_exponent, top_servers, append_maps_containing, server_filter, only_servers_containing, cache_key):
+def _get_chart_data_worker(start_date_str, days_to_show, only_maps_containing, maps_to_show, percision, top_servers, append_maps_containing, server_filter, only_servers_containing, cache_key):
     logging.debug("Generating new chart data (Worker - Optimized SQL)...")
     _start_time = time.time()
     _step_time = _start_time
 
     try:
-        logging.debug("[Chart] Connecting to database...")
-        with duckdb.connect(DB_FILE, read_only=True) as con:
+        with _cursor() as con:
             row = con.execute("SELECT max(timestamp) FROM snaps").fetchone()
             max_date_in_data = row[0] if row else None
             if not max_date_in_data:
@@ -766,16 +906,15 @@ def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containi
                 query_params.append(pattern)
 
             # 2. Server Filter (IP:Port)
-            if server_filter and isinstance(server_filter, str) and server_filter.upper() != 'ALL':
-                try:
-                    ip_str, port_str = server_filter.split(':', 1)
-                    ip_str = ip_str.strip()
-                    port_val = int(port_str.strip())
-                    if ip_str and port_val >= 0:
-                        where_clauses.append("s.ip = ? AND s.port = ?")
-                        query_params.extend([ip_str, port_val])
-                except Exception:
-                    pass
+            # Resolved to the integer server id up front so the predicate applies
+            # directly to the fact-table scan instead of the joined ip/port strings.
+            server_key = _parse_server_filter(server_filter)
+            filtered_server_id = None
+            if server_key:
+                row = con.execute("SELECT id FROM servers WHERE ip = ? AND port = ?", list(server_key)).fetchone()
+                filtered_server_id = row[0] if row else None
+                where_clauses.append("r.server_id = ?" if use_rollups else "sa.server_id = ?")
+                query_params.append(filtered_server_id)
 
             # 3. Server Name Filter
             pattern = _regex_filter_pattern(only_servers_containing)
@@ -792,29 +931,34 @@ def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containi
             where_str = " AND ".join(where_clauses)
 
             # --- FETCH 1: Total Snapshots per Bucket (Global denominator) ---
-            # This is NOT filtered by maps/servers because it represents the global availability of the system
-            daily_total_snapshots_df = con.execute(
+            # This is NOT filtered by maps/servers because it represents the global availability of the system.
+            # Staged once in a cursor-local temp table so the server pivot below can join it
+            # without scanning snaps a second time.
+            con.execute(
                 f"""
+                CREATE OR REPLACE TEMPORARY TABLE snap_counts AS
                 SELECT 
                     time_bucket(INTERVAL '{interval}', timestamp) as date,
-                    COUNT(DISTINCT guid) as total_snapshots
+                    COUNT(DISTINCT guid)::INTEGER as total_snapshots
                 FROM snaps 
                 WHERE timestamp >= ? AND timestamp < ?
                 GROUP BY 1
-                ORDER BY 1
                 """,
                 [window_start, window_end]
-            ).df()
-            daily_total_snapshots_df['date'] = pd.to_datetime(daily_total_snapshots_df['date'])
+            )
+            daily_total_snapshots_df = _fetch_df(con.execute("SELECT date, total_snapshots FROM snap_counts ORDER BY 1"))
+
+            # Bucket columns are TIMESTAMPs, so they already arrive as datetime64 and
+            # are used as-is (no per-frame pd.to_datetime conversion copy).
 
             # --- FETCH 2: Aggregated Player Sum per Map per Bucket (Filtered) ---
             if use_rollups:
-                df_agg = con.execute(
+                df_agg = _fetch_df(con.execute(
                     f"""
                     SELECT 
                         r.bucket as date,
                         m.name as map,
-                        SUM(r.players) as players
+                        SUM(r.players)::INTEGER as players
                     FROM sample_rollups_2h r
                     JOIN servers s ON r.server_id = s.id
                     JOIN maps m ON r.map_id = m.id
@@ -822,14 +966,14 @@ def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containi
                     GROUP BY 1, 2
                     """,
                     query_params
-                ).df()
+                ))
             else:
-                df_agg = con.execute(
+                df_agg = _fetch_df(con.execute(
                     f"""
                     SELECT 
                         time_bucket(INTERVAL '{interval}', sn.timestamp) as date,
                         m.name as map,
-                        SUM(sa.players) as players
+                        SUM(sa.players)::INTEGER as players
                     FROM samples_all sa
                     JOIN snaps sn ON sa.snapshot_id = sn.id
                     JOIN servers s ON sa.server_id = s.id
@@ -838,85 +982,131 @@ def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containi
                     GROUP BY 1, 2
                     """,
                     query_params
-                ).df()
-            df_agg['date'] = pd.to_datetime(df_agg['date'])
+                ))
 
-            # --- FETCH 3: Aggregated Player Sum per Server per Bucket (Filtered) ---
-            # Used for the "Top Servers" chart for the current view
+            # --- FETCH 3: Per-Server Contribution per Bucket, pivoted (Filtered) ---
+            # Used for the "Top Servers" chart for the current view. DuckDB divides by the
+            # bucket's snapshot count and pivots servers into columns, so pandas only
+            # receives the dense (buckets x servers) matrix.
             if use_rollups:
-                df_server_agg = con.execute(
-                    f"""
+                server_agg_sql = f"""
                     SELECT 
                         r.bucket as date,
-                        s.ip, s.port,
-                        SUM(r.players) as players
+                        r.server_id,
+                        SUM(r.players)::INTEGER as players
                     FROM sample_rollups_2h r
                     JOIN servers s ON r.server_id = s.id
                     JOIN maps m ON r.map_id = m.id
                     WHERE {where_str}
-                    GROUP BY 1, 2, 3
-                    """,
-                    query_params
-                ).df()
+                    GROUP BY 1, 2
+                """
             else:
-                df_server_agg = con.execute(
-                    f"""
+                server_agg_sql = f"""
                     SELECT 
                         time_bucket(INTERVAL '{interval}', sn.timestamp) as date,
-                        s.ip, s.port,
-                        SUM(sa.players) as players
+                        sa.server_id,
+                        SUM(sa.players)::INTEGER as players
                     FROM samples_all sa
                     JOIN snaps sn ON sa.snapshot_id = sn.id
                     JOIN servers s ON sa.server_id = s.id
                     JOIN maps m ON sa.map_id = m.id
                     WHERE {where_str}
-                    GROUP BY 1, 2, 3
-                    """,
-                    query_params
-                ).df()
-            df_server_agg['date'] = pd.to_datetime(df_server_agg['date'])
-
-            # --- FETCH 4: Global server stats (Unfiltered window) ---
-            # Used for the "Global Server Ranking" table
-            if use_rollups:
-                df_global_server_agg = con.execute(
+                    GROUP BY 1, 2
+                """
+            # PIVOT cannot take bound parameters when its columns come from the data,
+            # so the filtered aggregate is staged in a cursor-local temp table first.
+            con.execute(
+                f"""
+                CREATE OR REPLACE TEMPORARY TABLE server_contrib AS
+                SELECT 
+                    a.date,
+                    a.server_id as server,
+                    a.players / COALESCE(NULLIF(c.total_snapshots, 0), 1) as avg_contrib
+                FROM ({server_agg_sql}) a
+                LEFT JOIN snap_counts c ON a.date = c.date
+                """,
+                query_params
+            )
+            if con.execute("SELECT count(*) FROM server_contrib").fetchone()[0]:
+                if filtered_server_id is not None:
+                    # A single server is already one (date, value) series; no PIVOT needed
+                    server_pivot_df = _fetch_df(con.execute(
+                        "SELECT date, avg_contrib FROM server_contrib ORDER BY date"
+                    )).set_index('date')
+                    server_pivot_df.columns = pd.Index([filtered_server_id], dtype=np.int64)
+                else:
+                    server_pivot_df = _fetch_df(con.execute(
+                        "PIVOT server_contrib ON server USING SUM(avg_contrib) GROUP BY date ORDER BY date"
+                    ))
+                    server_pivot_df = server_pivot_df.set_index('date')
+                    # PIVOT names the columns after the integer ids as strings
+                    server_pivot_df.columns = server_pivot_df.columns.astype(np.int64)
+                # ip:port keys are only built for the servers in view, not per row
+                server_keys = dict(con.execute(
                     """
-                    SELECT 
-                        r.bucket as date,
-                        s.ip, s.port,
-                        SUM(r.players) as players
-                    FROM sample_rollups_2h r
-                    JOIN servers s ON r.server_id = s.id
-                    WHERE r.bucket >= ? AND r.bucket < ?
-                    GROUP BY 1, 2, 3
-                    """,
-                    [window_start, window_end]
-                ).df()
+                    SELECT id, ip || ':' || CAST(port AS VARCHAR)
+                    FROM servers
+                    WHERE id IN (SELECT DISTINCT server FROM server_contrib)
+                    """
+                ).fetchall())
             else:
-                df_global_server_agg = con.execute(
+                server_pivot_df = pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+                server_keys = {}
+            con.execute("DROP TABLE server_contrib")
+
+            # --- FETCH 4: Global server contributions (Unfiltered window) ---
+            # Used for the "Global Server Ranking" table. Only the per-server totals are
+            # needed (no time series), so DuckDB reduces all the way to one row per server.
+            # It only depends on the window, so it is shared by every filter/param
+            # combination over the same window until new data arrives.
+            global_key = (DB_FILE, cache_key[0], window_start, window_end)
+            with g_served_lock:
+                df_global_server_totals = g_global_server_totals_cache.get(global_key)
+            if df_global_server_totals is None:
+                if use_rollups:
+                    global_server_agg_sql = """
+                        SELECT 
+                            r.bucket as date,
+                            r.server_id,
+                            SUM(r.players) as players
+                        FROM sample_rollups_2h r
+                        WHERE r.bucket >= ? AND r.bucket < ?
+                        GROUP BY 1, 2
+                    """
+                else:
+                    global_server_agg_sql = f"""
+                        SELECT 
+                            time_bucket(INTERVAL '{interval}', sn.timestamp) as date,
+                            sa.server_id,
+                            SUM(sa.players) as players
+                        FROM samples_all sa
+                        JOIN snaps sn ON sa.snapshot_id = sn.id
+                        WHERE sn.timestamp >= ? AND sn.timestamp < ?
+                        GROUP BY 1, 2
+                    """
+                df_global_server_totals = _fetch_df(con.execute(
                     f"""
                     SELECT 
-                        time_bucket(INTERVAL '{interval}', sn.timestamp) as date,
-                        s.ip, s.port,
-                        SUM(sa.players) as players
-                    FROM samples_all sa
-                    JOIN snaps sn ON sa.snapshot_id = sn.id
-                    JOIN servers s ON sa.server_id = s.id
-                    WHERE sn.timestamp >= ? AND sn.timestamp < ?
-                    GROUP BY 1, 2, 3
+                        s.ip || ':' || CAST(s.port AS VARCHAR) as server,
+                        t.contrib
+                    FROM (
+                        SELECT 
+                            a.server_id,
+                            SUM(a.players / COALESCE(NULLIF(c.total_snapshots, 0), 1)) as contrib
+                        FROM ({global_server_agg_sql}) a
+                        LEFT JOIN snap_counts c ON a.date = c.date
+                        GROUP BY 1
+                    ) t
+                    JOIN servers s ON t.server_id = s.id
+                    ORDER BY 2 DESC, 1
                     """,
                     [window_start, window_end]
-                ).df()
-            df_global_server_agg['date'] = pd.to_datetime(df_global_server_agg['date'])
-
-            # Helper to fetch server names for labeling
-            server_names_map = {}
-            try:
-                rows = con.execute("SELECT ip, port, name FROM server_names").fetchall()
-                for r_ip, r_port, r_name in rows:
-                    server_names_map[(r_ip, r_port)] = r_name
-            except Exception as e:
-                logging.debug(f"Failed to load server names: {e}")
+                ))
+                with g_served_lock:
+                    g_global_server_totals_cache[global_key] = df_global_server_totals
+                    while len(g_global_server_totals_cache) > GLOBAL_TOTALS_CACHE_MAX_ENTRIES:
+                        g_global_server_totals_cache.popitem(last=False)
+            con.execute("DROP TABLE snap_counts")
 
     except Exception as e:
         logging.error(f"[Chart] Failed to load data from DuckDB: {e}")
@@ -933,56 +1123,64 @@ def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containi
     full_time_index = pd.date_range(start=pd.Timestamp(start_date).floor('2h'), end=pd.Timestamp(end_date).ceil('2h'), freq='2h')
     full_time_index = full_time_index[(full_time_index >= pd.Timestamp(start_date)) & (full_time_index < pd.Timestamp(end_date))]
     
-    # Merge with total snapshots to get avg_players
-    merged_df = pd.merge(df_agg, daily_total_snapshots_df, on='date', how='left')
-    merged_df['total_snapshots'] = merged_df['total_snapshots'].fillna(1).replace(0, 1)
+    # Divide by the bucket's snapshot count to get avg_players (a lookup per row, no merge copy)
+    snaps_per_bucket = daily_total_snapshots_df.set_index('date')['total_snapshots']
+    merged_df = df_agg
+    merged_df['total_snapshots'] = merged_df['date'].map(snaps_per_bucket).fillna(1).replace(0, 1)
     merged_df['avg_players'] = (merged_df['players'] / merged_df['total_snapshots']).round(percision)
     
     # Percentage calculation
     daily_total_avg_players = merged_df.groupby('date')['avg_players'].transform('sum')
     merged_df['player_percentage'] = (merged_df['avg_players'] / daily_total_avg_players.replace(0, 1) * 100).fillna(0)
 
-    top_maps = merged_df.groupby('map')['avg_players'].sum().nlargest(maps_to_show).index
+    # Per-map totals drive the top-N pick, the appended-map order and the ranking table
+    map_total_contrib = merged_df.groupby('map')['avg_players'].sum()
+    top_maps = map_total_contrib.nlargest(maps_to_show).index
+    # One (bucket x map) matrix, reindexed once, instead of a filter + reindex per dataset
+    wide = (
+        merged_df.groupby(['date', 'map'], sort=False, observed=True)['player_percentage'].sum()
+        .unstack('map', fill_value=0.0)
+        .reindex(full_time_index, fill_value=0)
+    )
     datasets = []
     for map_name in top_maps:
-        map_data = merged_df[merged_df['map'] == map_name]
         datasets.append({
             'label': map_name,
-            'data': list(map_data.set_index('date')['player_percentage'].reindex(full_time_index, fill_value=0)),
-            'backgroundColor': get_color(len(datasets), len(top_maps), color_intensity),
-            'borderColor': get_color(len(datasets), len(top_maps), color_intensity).replace('rgb', 'rgba').replace(')', ', 1)'),
+            'data': np.nan_to_num(wide[map_name].to_numpy(dtype=np.float64), nan=0.0).tolist(),
+            '_color': (len(datasets), len(top_maps)),
             'borderWidth': 1
         })
 
     appended_map_names = []
-    pattern = _regex_filter_pattern(append_maps_containing)
-    if pattern:
-        try:
-            matched = merged_df[merged_df['map'].str.contains(pattern, na=False, regex=True)]['map'].unique().tolist()
-            appended_map_names = [m for m in matched if m not in set(top_maps)]
-            if appended_map_names:
-                avg_map = merged_df.groupby('map')['avg_players'].sum()
-                appended_map_names.sort(key=lambda m: float(avg_map.get(m, 0)), reverse=True)
-        except re.error:
-            pass
+    tokens = _literal_filter_tokens(append_maps_containing)
+    if tokens:
+        # Tokens are plain substrings, so test each distinct map name once
+        # instead of running a regex alternation over every row.
+        top_maps_set = set(top_maps)
+        appended_map_names = [
+            m for m in merged_df['map'].dropna().unique()
+            if m not in top_maps_set and any(t in m.lower() for t in tokens)
+        ]
+        if appended_map_names:
+            appended_map_names.sort(key=lambda m: float(map_total_contrib.get(m, 0)), reverse=True)
 
     for map_name in appended_map_names:
-        map_data = merged_df[merged_df['map'] == map_name]
         datasets.append({
             'label': map_name,
-            'data': list(map_data.set_index('date')['player_percentage'].reindex(full_time_index, fill_value=0)),
-            'backgroundColor': get_color(len(datasets), max(1, len(top_maps) + len(appended_map_names)), color_intensity),
-            'borderColor': get_color(len(datasets), max(1, len(top_maps) + len(appended_map_names)), color_intensity).replace('rgb', 'rgba').replace(')', ', 1)'),
+            'data': np.nan_to_num(wide[map_name].to_numpy(dtype=np.float64), nan=0.0).tolist(),
+            '_color': (len(datasets), max(1, len(top_maps) + len(appended_map_names))),
             'borderWidth': 1
         })
 
     other_exclude = set(top_maps).union(set(appended_map_names))
-    other_maps_df = merged_df[~merged_df['map'].isin(other_exclude)]
-    if not other_maps_df.empty:
-        other_data = other_maps_df.groupby('date')['player_percentage'].sum().reindex(full_time_index, fill_value=0)
+    is_other = ~merged_df['map'].isin(other_exclude)
+    has_other_maps = bool(is_other.any())
+    if has_other_maps:
+        # Zero out shown maps instead of copying the remaining rows into a new frame
+        other_data = merged_df['player_percentage'].where(is_other, 0).groupby(merged_df['date']).sum().reindex(full_time_index, fill_value=0)
         datasets.append({
             'label': 'Other',
-            'data': list(other_data),
+            'data': np.nan_to_num(other_data.to_numpy(dtype=np.float64), nan=0.0).tolist(),
             'backgroundColor': 'rgba(128, 128, 128, 0.5)',
             'borderColor': 'rgba(128, 128, 128, 1)',
             'borderWidth': 1
@@ -990,50 +1188,53 @@ def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containi
 
     # --- PROCESS 2: Daily Totals (Overall popularity line) ---
     daily_total_players_sum = df_agg.groupby('date')['players'].sum()
-    daily_totals_indexed = daily_total_snapshots_df.set_index('date')['total_snapshots']
-    daily_totals_df = (daily_total_players_sum.div(daily_totals_indexed, fill_value=0)).fillna(0)
-    daily_totals = daily_totals_df.reindex(full_time_index, fill_value=0).round(percision).tolist()
-    snapshot_counts = daily_totals_indexed.reindex(full_time_index, fill_value=0).tolist()
+    daily_totals_df = (daily_total_players_sum.div(snaps_per_bucket, fill_value=0)).fillna(0)
+    daily_totals = np.nan_to_num(daily_totals_df.reindex(full_time_index, fill_value=0).to_numpy(dtype=np.float64), nan=0.0)
+    np.round(daily_totals, percision, out=daily_totals)
+    window_snapshot_counts = snaps_per_bucket.reindex(full_time_index, fill_value=0)
+    snapshot_counts = window_snapshot_counts.tolist()
+    num_valid_buckets = max(1, int((window_snapshot_counts > 0).sum()))
 
     # --- PROCESS 3: Server Contributions (View-specific) ---
     try:
-        srv = df_server_agg.merge(daily_totals_indexed.rename('snapshots'), left_on='date', right_index=True, how='left')
-        srv['snapshots'] = srv['snapshots'].fillna(1).replace(0, 1)
-        srv['avg_contrib'] = (srv['players'] / srv['snapshots']).fillna(0)
-        srv['server'] = srv['ip'] + ':' + srv['port'].astype(str)
-
-        pivot = srv.pivot_table(index='date', columns='server', values='avg_contrib', aggfunc='sum').reindex(full_time_index, fill_value=0)
-        
-        num_valid_buckets = (daily_totals_indexed.reindex(full_time_index, fill_value=0) > 0).sum()
-        num_valid_buckets = max(1, num_valid_buckets)
-        averages = (pivot.sum(axis=0) / num_valid_buckets).sort_values(ascending=False)
-
-        top_n = min(int(top_servers or 10), pivot.shape[1])
-        top_servers_list = list(averages.head(top_n).index) if top_n > 0 else []
-        server_ranking = [{ 'id': s, 'label': s, 'pop': round(float(averages[s]), 2) } for s in top_servers_list]
+        # reindex already returns a fresh frame, so fill PIVOT's NULL cells in place
+        pivot = server_pivot_df.reindex(full_time_index, fill_value=0)
+        pivot.fillna(0, inplace=True)
+        # The matrix is kept as float32 to halve the bytes moved by the reorder and
+        # slices below; reductions accumulate in float64 so totals stay exact enough
+        # for the 2-decimal rankings.
+        values = pivot.to_numpy(dtype=np.float32)
+
+        averages = pd.Series(values.sum(axis=0, dtype=np.float64) / num_valid_buckets, index=pivot.columns).sort_values(ascending=False)
+        # Reorder the columns once by rank so top-N and Other are contiguous slices
+        ordered = values[:, pivot.columns.get_indexer(averages.index)]
+        avg_values = averages.to_numpy()
+
+        top_n = max(0, min(int(top_servers or 10), pivot.shape[1]))
+        top_servers_list = list(averages.index[:top_n])
+        server_ranking = [{ 'id': server_keys[s], 'label': server_keys[s], 'pop': round(float(avg_values[i]), 2) } for i, s in enumerate(top_servers_list)]
         
         if pivot.shape[1] > top_n:
-            other_val = float(averages.iloc[top_n:].sum())
+            other_val = float(avg_values[top_n:].sum())
             if other_val > 0:
                 server_ranking.append({ 'id': 'Other', 'label': 'Other', 'pop': round(other_val, 2) })
 
+        top_arr = np.round(ordered[:, :top_n].astype(np.float64), percision)
         total_players_server_datasets = []
         for idx, server in enumerate(top_servers_list):
-            series = pivot[server].fillna(0)
             total_players_server_datasets.append({
-                'label': server,
-                'data': list(series.round(percision).astype(float).values),
-                'backgroundColor': get_color(idx, max(1, len(top_servers_list)), color_intensity).replace('rgb', 'rgba').replace(')', ', 0.5)'),
-                'borderColor': get_color(idx, max(1, len(top_servers_list)), color_intensity),
+                'label': server_keys[server],
+                'data': top_arr[:, idx].tolist(),
+                '_color': (idx, max(1, len(top_servers_list))),
                 'fill': True,
                 'stack': 'servers',
             })
 
-        if pivot.shape[1] > len(top_servers_list):
-            other_series = pivot.drop(columns=top_servers_list, errors='ignore').sum(axis=1).fillna(0)
+        if pivot.shape[1] > top_n:
+            other_arr = ordered[:, top_n:].sum(axis=1, dtype=np.float64)
             total_players_server_datasets.append({
                 'label': 'Other',
-                'data': list(other_series.round(percision).astype(float).values),
+                'data': np.round(other_arr, percision).tolist(),
                 'backgroundColor': 'rgba(128,128,128,0.4)',
                 'borderColor': 'rgba(128,128,128,1)',
                 'fill': True,
@@ -1046,13 +1247,7 @@ def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containi
 
     # --- PROCESS 4: Global Server Ranking (Window-specific) ---
     try:
-        gsrv = df_global_server_agg.merge(daily_totals_indexed.rename('snapshots'), left_on='date', right_index=True, how='left')
-        gsrv['snapshots'] = gsrv['snapshots'].fillna(1).replace(0, 1)
-        gsrv['avg_contrib'] = (gsrv['players'] / gsrv['snapshots']).fillna(0)
-        gsrv['server'] = gsrv['ip'] + ':' + gsrv['port'].astype(str)
-        
-        # We can aggregate directly since we don't need a time series for global ranking
-        g_averages = (gsrv.groupby('server')['avg_contrib'].sum() / num_valid_buckets).sort_values(ascending=False)
+        g_averages = df_global_server_totals.set_index('server')['contrib'] / num_valid_buckets
         top_n_w = min(10, len(g_averages))
         global_server_ranking = [{ 'label': srv, 'pop': round(float(g_averages[srv]), 2) } for srv in list(g_averages.head(top_n_w).index)]
         if len(g_averages) > top_n_w:
@@ -1064,86 +1259,94 @@ def _get_chart_data_worker_impl(start_date_str, days_to_show, only_maps_containi
         global_server_ranking = []
 
     # --- PROCESS 5: Map Ranking ---
-    map_total_contrib = merged_df.groupby('map')['avg_players'].sum()
     total_contrib_sum = map_total_contrib.sum()
     ranking = []
     if total_contrib_sum > 0:
-        top_maps_contrib = map_total_contrib[map_total_contrib.index.isin(top_maps)].sort_values(ascending=False)
-        ranking = (top_maps_contrib / total_contrib_sum * 100).round(2).reset_index(name='pop').rename(columns={'map': 'label'}).to_dict('records')
-        
-        if appended_map_names:
-            app_maps_contrib = map_total_contrib[map_total_contrib.index.isin(appended_map_names)].sort_values(ascending=False)
-            ranking += (app_maps_contrib / total_contrib_sum * 100).round(2).reset_index(name='pop').rename(columns={'map': 'label'}).to_dict('records')
-
-        if not other_maps_df.empty:
-            other_maps_contrib_sum = map_total_contrib[~map_total_contrib.index.isin(other_exclude)].sum()
+        # Label every map once (0 = top, 1 = appended, 2 = rest), compute the shares
+        # once, then read each group off a single descending order.
+        contrib = map_total_contrib.to_numpy()
+        group = np.where(map_total_contrib.index.isin(top_maps), 0, np.where(map_total_contrib.index.isin(appended_map_names), 1, 2))
+        pct = np.round(contrib / total_contrib_sum * 100, 2)
+        order = np.argsort(-contrib, kind='stable')
+        ordered_labels, ordered_pct, ordered_group = map_total_contrib.index.to_numpy()[order], pct[order], group[order]
+        for g in (0, 1):
+            in_group = ordered_group == g
+            ranking += [{'label': label, 'pop': pop} for label, pop in zip(ordered_labels[in_group].tolist(), ordered_pct[in_group].tolist())]
+
+        if has_other_maps:
+            other_maps_contrib_sum = contrib[group == 2].sum()
             if other_maps_contrib_sum > 0:
                 ranking.append({'label': 'Other', 'pop': round((other_maps_contrib_sum / total_contrib_sum) * 100, 2)})
 
-    def _sanitize_dataset_list(ds_list):
-        out = []
-        for ds in ds_list:
-            s = dict(ds)
-            if isinstance(s.get('data'), list):
-                s['data'] = [0 if (isinstance(v, float) and (np.isnan(v))) else (float(v) if isinstance(v, (np.floating, np.integer)) else v) for v in s['data']]
-            out.append(s)
-        return out
-
     result = {
         'labels': [d.isoformat() for d in full_time_index],
-        'datasets': _sanitize_dataset_list(datasets),
-        'dailyTotals': [0 if (isinstance(v, float) and np.isnan(v)) else float(v) for v in daily_totals],
+        'datasets': datasets,
+        'dailyTotals': daily_totals.tolist(),
         'snapshotCounts': [int(v) for v in snapshot_counts],
         'ranking': ranking,
         'shownMapsCount': len(top_maps),
-        'totalPlayersServerDatasets': _sanitize_dataset_list(total_players_server_datasets),
+        'totalPlayersServerDatasets': total_players_server_datasets,
         'serverRanking': server_ranking,
         'globalServerRanking': global_server_ranking,
         'appendedMapsCount': len(appended_map_names),
     }
 
-    # Label Labeling (Server Names)
-    def get_server_display_name(s_ip, s_port):
-        try:
-            return server_names_map.get((s_ip, int(s_port)), f"{s_ip}:{s_port}")
-        except:
-            return f"{s_ip}:{s_port}"
-
-    for key in ['serverRanking', 'totalPlayersServerDatasets', 'globalServerRanking']:
-        if key in result:
-            for item in result[key]:
-                label = item.get('label')
-                if label and ':' in label and label != 'Other':
-                    try:
-                        s_ip, s_port = label.split(':', 1)
-                        item['label'] = get_server_display_name(s_ip, s_port)
-                    except:
-                        pass
+    # Label Labeling (Server Names): ip:port -> display name in one pass over all three lists.
+    # g_known_server_names is loaded once at startup and kept current by
+    # save_server_names_to_db, so the server_names table is not re-read per chart.
+    server_names_map = g_known_server_names
+    for item in (*server_ranking, *total_players_server_datasets, *global_server_ranking):
+        label = item.get('label')
+        if label and label != 'Other':
+            s_ip, sep, s_port = label.partition(':')
+            if sep and s_port.isdigit():
+                item['label'] = server_names_map.get((s_ip, int(s_port)), label)
 
     logging.info(f"[Chart] Generation complete in {time.time() - _start_time:.2f}s (results={len(datasets)})")
-    g_chart_data_cache[cache_key] = {'timestamp': time.time(), 'data': result}
+    with g_served_lock:
+        g_chart_data_cache[cache_key] = {'timestamp': time.time(), 'data': result}
+        g_chart_data_cache.move_to_end(cache_key)
+        while len(g_chart_data_cache) > CHART_CACHE_MAX_ENTRIES:
+            g_chart_data_cache.popitem(last=False)
     return result
 
 # ─── New Helper ───────────────────────────────────────────────────────────────
-def get_recent_ips(days=7):
+# Semi-joins instead of a DISTINCT over the full join. Qualifying snapshots are
+# found through idx_snaps_timestamp, and their smallest id is an exact lower
+# bound that lets DuckDB skip older sample row groups by zone map.
+_RECENT_IPS_SQL = """
+    SELECT s.ip, s.port
+    FROM servers s
+    WHERE s.id IN (
+        SELECT sa.server_id
+        FROM samples_all sa
+        WHERE sa.snapshot_id >= (SELECT min(id) FROM snaps WHERE timestamp >= ?)
+          AND sa.snapshot_id IN (SELECT id FROM snaps WHERE timestamp >= ?)
+    )
+"""
+
+def get_recent_ips(days=7, exclude=None):
     """
     Fetch distinct (ip, port) pairs that have appeared in the DB 
-    within the last N days.
+    within the last N days. Pairs in `exclude` (e.g. the current scan list)
+    are filtered out by DuckDB with an anti join.
     """
     try:
-        with duckdb.connect(DB_FILE) as con:
-            cutoff = (datetime.now() - pd.Timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
-            rows = con.execute(
+        with _cursor() as con:
+            cutoff = datetime.now() - timedelta(days=days)
+            if exclude:
+                con.register('scan_list', pd.DataFrame(exclude, columns=['ip', 'port']))
+                sql = f"""
+                    SELECT r.ip, r.port
+                    FROM ({_RECENT_IPS_SQL}) r
+                    ANTI JOIN scan_list l ON r.ip = l.ip AND r.port = l.port
                 """
-                SELECT DISTINCT s.ip, s.port 
-                FROM samples_all sa
-                JOIN snaps sn ON sa.snapshot_id = sn.id
-                JOIN servers s ON sa.server_id = s.id
-                WHERE sn.timestamp >= ?
-                """,
-                [cutoff]
-            ).fetchall()
-            return [(r[0], int(r[1])) for r in rows]
+            else:
+                sql = _RECENT_IPS_SQL
+            ips, ports = _fetch_columns(con.execute(sql, [cutoff, cutoff]))
+            if exclude:
+                con.unregister('scan_list')
+            return list(zip(ips, ports))
     except Exception as e:
         logging.error(f"Failed to fetch recent IPs from DB: {e}")
         return []
@@ -2,20 +2,36 @@
 from __future__ import annotations
 
 import os
+import time
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone
 from flask import Blueprint, jsonify, request, current_app
 
 from database import (
     get_chart_data,
+    get_chart_etag,
     get_data_freshness,
     get_date_range,
     DB_FILE
 )
-from utils import rate_limiter
+from utils import parse_chart_params, rate_limiter
 
 bp = Blueprint("routes", __name__)
 
+# Serialized /api/data bodies keyed by ETag, shared by every client polling the
+# same params. The ETag already encodes the data generation, so entries never
+# go stale; the LRU bound just caps memory.
+DATA_RESPONSE_CACHE_MAX_ENTRIES = 32
+_data_response_cache = OrderedDict()
+_data_response_cache_lock = threading.Lock()
+
+# /api/csv_status is polled by every open dashboard; the DB file's existence is
+# re-checked on disk at most once per CSV_STATUS_TTL seconds.
+CSV_STATUS_TTL = 1.0
+_db_exists_cache = {'checked_at': float('-inf'), 'exists': False}
+
 # ─── Data Endpoints ───────────────────────────────────────────────────
 @bp.route("/api/data")
 @rate_limiter
@@ -24,14 +40,12 @@ def get_data():
     Main data endpoint. It's stateless and reads all parameters from the
     request query string, providing sensible defaults.
     """
-    from utils import parse_chart_params
-    
     # Parse and sanitize parameters
     params = parse_chart_params(request.args)
     
     logging.info(f"Chart request from {request.remote_addr}: {params}")
     
-    chart_data = get_chart_data(
+    chart_params = dict(
         start_date_str=params['start_date_str'],
         days_to_show=params['days_to_show'],
         only_maps_containing=params['only_maps_containing'],
@@ -44,7 +58,32 @@ def get_data():
         server_filter=params['server_filter'],
         only_servers_containing=params['only_servers_containing']
     )
-    return jsonify(chart_data)
+
+    # Repeat requests for unchanged data skip both the build and the serialization
+    etag = get_chart_etag(**chart_params)
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        with _data_response_cache_lock:
+            body = _data_response_cache.get(etag)
+            if body is not None:
+                _data_response_cache.move_to_end(etag)
+        if body is None:
+            data = get_chart_data(**chart_params)
+            # get_chart_data leaves its empty fallback (DB error, no data) uncached
+            # so the next request retries. Neither the body cache nor the client
+            # may pin it, so it goes out without a validator.
+            if not data.get('labels'):
+                return jsonify(data)
+            body = current_app.json.dumps(data)
+            with _data_response_cache_lock:
+                _data_response_cache[etag] = body
+                while len(_data_response_cache) > DATA_RESPONSE_CACHE_MAX_ENTRIES:
+                    _data_response_cache.popitem(last=False)
+        response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    return response
 
 @bp.route("/api/data_freshness")
 @rate_limiter
@@ -56,7 +95,10 @@ def get_freshness():
 @rate_limiter
 def csv_status():
     # Backwards-compatible endpoint; now reports status based on cached data
-    exists = os.path.exists(DB_FILE)
+    now = time.monotonic()
+    if now - _db_exists_cache['checked_at'] > CSV_STATUS_TTL:
+        _db_exists_cache.update(checked_at=now, exists=os.path.exists(DB_FILE))
+    exists = _db_exists_cache['exists']
     # Check if cache has data (non-blocking check)
     dr = get_date_range()
     empty = dr.get('min_date') is None
@@ -177,13 +219,17 @@ def admin_unblock_ip():
         "message": f"IP {ip} has been unblocked" if success else f"IP {ip} was not blocked"
     })
 
+# Headers that affect how the client address is resolved behind the proxy
+DEBUG_WHOAMI_HEADERS = ('Host', 'User-Agent', 'X-Forwarded-For', 'X-Forwarded-Proto', 'X-Real-IP', 'CF-Connecting-IP')
+
 @bp.route("/debug-whoami")
+@admin_only
 def debug_whoami():
     """Debug endpoint to see what Flask sees about the request."""
     return jsonify({
         "remote_addr": request.remote_addr,
         "access_route": list(request.access_route),
-        "headers": dict(request.headers),
+        "headers": {name: request.headers.get(name) for name in DEBUG_WHOAMI_HEADERS},
         "environ_remote_addr": request.environ.get('REMOTE_ADDR'),
         "x_forwarded_for": request.headers.get('X-Forwarded-For')
     })
@@ -1,19 +1,21 @@
 import time
+import asyncio
+import threading
 import logging
 import socket
-import re
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
 
-import a2s
+from a2s.a2s_async import A2SSharedSocket, request_async_impl
+from a2s.defaults import DEFAULT_ENCODING
+from a2s.info import InfoProtocol
 from database import (
     load_cooldowns_from_db,
     save_cooldowns_to_db,
     write_samples,
     save_server_names_to_db,
-    update_replica_db,
     refresh_served_cache,
     record_snapshot,
+    flush_snapshots,
     ReaderTimeFormat,
     get_recent_ips
 )
@@ -21,48 +23,69 @@ from steam_api import get_server_list
 from utils import is_valid_public_ip, sanitize_server_name
 
 # ─── Constants ────────────────────────────────────────────────────────────────
-SCAN_THREADS = 200
+SCAN_CONCURRENCY = 1000 # Outstanding UDP queries on the shared socket
 MAX_SINGLE_IP_TIMEOUT = 5.0
 BASE_SKIP_DURATION = 60
 MAX_SKIP_DURATION = 600
 SERVER_TIMEOUT = 2.0 # Default start timeout
 SCAN_INTERVAL = 300 # 5 minutes
-REPLICA_UPDATE_INTERVAL = 3600 # Replica is now a periodic backup, not the live read path
+
+# Skip duration after N consecutive failures is _SKIP_DURATIONS[N - 1]; it
+# saturates at MAX_SKIP_DURATION long before the table runs out.
+_SKIP_DURATIONS = tuple(min(MAX_SKIP_DURATION, BASE_SKIP_DURATION << i) for i in range(16))
+
+# Deletion table for control characters (C0, DEL, C1) in reported map names
+_CTRL_DELETE = dict.fromkeys([*range(0x00, 0x20), 0x7F, *range(0x80, 0xA0)])
 
 # Load cooldowns on module load (or when starting the scanner)
 server_cooldowns = load_cooldowns_from_db()
+# Guards every read-modify-write of server_cooldowns and the snapshot taken for
+# saving. Each operation is a few dict ops, so one coarse lock is plenty.
+server_cooldowns_lock = threading.Lock()
+
+_DEFAULT_COOLDOWN = {'timeout': SERVER_TIMEOUT, 'failures': 0, 'skip_until': 0}
+
+def _get_server_cooldown(server_key):
+    with server_cooldowns_lock:
+        return server_cooldowns.get(server_key, _DEFAULT_COOLDOWN)
+
+def _store_server_cooldown_locked(server_key, timeout, failures, skip_until):
+    # Known servers are updated in place, so a scan cycle allocates no new
+    # entries once every server has been seen.
+    cooldown = server_cooldowns.get(server_key)
+    if cooldown is None:
+        server_cooldowns[server_key] = {'timeout': timeout, 'failures': failures, 'skip_until': skip_until}
+    else:
+        cooldown['timeout'] = timeout
+        cooldown['failures'] = failures
+        cooldown['skip_until'] = skip_until
 
 def _set_server_cooldown(server_key, timeout, failures, skip_until):
-    server_cooldowns[server_key] = {
-        'timeout': timeout,
-        'failures': failures,
-        'skip_until': skip_until
-    }
+    with server_cooldowns_lock:
+        _store_server_cooldown_locked(server_key, timeout, failures, skip_until)
 
-def _record_server_failure(server_key, cooldown, now, reason, detail=None):
+def _record_server_failure(server_key, now, reason, detail=None):
     ip_str, port = server_key
-    failures = cooldown['failures'] + 1
-    new_timeout = min(MAX_SINGLE_IP_TIMEOUT, cooldown['timeout'] * 2)
-    skip_duration = min(MAX_SKIP_DURATION, BASE_SKIP_DURATION * (2 ** (failures - 1)))
-    skip_until = now + skip_duration
+    with server_cooldowns_lock:
+        # Re-read under the lock so concurrent failures are counted, not overwritten
+        cooldown = server_cooldowns.get(server_key, _DEFAULT_COOLDOWN)
+        failures = cooldown['failures'] + 1
+        new_timeout = min(MAX_SINGLE_IP_TIMEOUT, cooldown['timeout'] * 2)
+        skip_duration = _SKIP_DURATIONS[min(failures, len(_SKIP_DURATIONS)) - 1]
+        _store_server_cooldown_locked(server_key, new_timeout, failures, now + skip_duration)
     message = f"{reason} for {ip_str}:{port}"
     if detail:
         message += f": {detail}"
     logging.debug(f"{message} (failure #{failures}, skip for {skip_duration}s)")
-    _set_server_cooldown(server_key, new_timeout, failures, skip_until)
 
-def IpReader(ip):
-    """Query single game server, return CSV row or None."""
+async def IpReaderAsync(ip, semaphore, shared):
+    """Query single game server, return raw (ip, port, map, players, server_name) or None."""
     ip_str, port = ip
     server_key = (ip_str, port)
     now = time.time()
     
     # Get or initialize cooldown info for this server
-    cooldown = server_cooldowns.get(server_key, {
-        'timeout': SERVER_TIMEOUT,
-        'failures': 0,
-        'skip_until': 0
-    })
+    cooldown = _get_server_cooldown(server_key)
     
     # Skip if in cooldown period
     if now < cooldown['skip_until']:
@@ -71,55 +94,72 @@ def IpReader(ip):
     timeout = cooldown['timeout']
 
     try:
-        info = a2s.info(ip, timeout=timeout)
-        map_name = re.sub(r'[\r\n\x00-\x1F\x7F-\x9F]', '', info.map_name).strip()
-        timestamp = datetime.now().strftime(ReaderTimeFormat)
-        
-        logging.debug(f"OK {ip_str}:{port} | {info.player_count} players | {map_name}")
+        async with semaphore:
+            conn = shared.stream(ip, timeout)
+            try:
+                info = await request_async_impl(conn, DEFAULT_ENCODING, InfoProtocol)
+            finally:
+                conn.close()
+        logging.debug(f"OK {ip_str}:{port} | {info.player_count} players | {info.map_name!r}")
         
         # Success! Reduce timeout and reset failure count
         _set_server_cooldown(server_key, max(0.1, timeout * 0.9), 0, 0)
-        return [ip_str, str(port), map_name, str(info.player_count), timestamp, sanitize_server_name(str(info.server_name))]
+        return (ip_str, port, info.map_name, info.player_count, info.server_name)
 
-    except (socket.timeout, ConnectionResetError):
-        _record_server_failure(server_key, cooldown, now, "Timeout")
+    except (asyncio.TimeoutError, socket.timeout, ConnectionResetError):
+        _record_server_failure(server_key, now, "Timeout")
         return None
 
     except Exception as e:
-        _record_server_failure(server_key, cooldown, now, "Error", str(e))
+        _record_server_failure(server_key, now, "Error", str(e))
         return None
 
+async def _scan_all(servers):
+    # One event loop and one UDP socket drive every query; the semaphore only
+    # bounds how many are in flight so reply bursts fit the receive buffer.
+    semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+    shared = await A2SSharedSocket.create()
+    try:
+        return await asyncio.gather(
+            *(IpReaderAsync(ip, semaphore, shared) for ip in servers),
+            return_exceptions=True
+        )
+    finally:
+        shared.close()
+
 def IpReaderMulti(lst, snapshot_id, snapshot_dt_str):
-    """Process a list of IPs and append a snapshot_id using multiple threads."""
-    out = []
+    """Process a list of IPs and append a snapshot_id, querying them concurrently."""
     skipped = 0
+    # Every row carries the snapshot time, so it is parsed once rather than
+    # formatted per server and re-parsed per row by write_samples.
+    snapshot_ts = datetime.strptime(snapshot_dt_str, ReaderTimeFormat)
     
     valid_servers = [(ip, port) for ip, port in lst if is_valid_public_ip(ip)]
     filtered_count = len(lst) - len(valid_servers)
     if filtered_count > 0:
         logging.info(f"Filtered out {filtered_count} invalid/link-local addresses")
     
-    with ThreadPoolExecutor(max_workers=SCAN_THREADS) as executor:
-        # We don't pass the timestamp to IpReader to avoid changing its signature too much,
-        # instead we just append it here since IpReader returns [ip, port, map, players, <old_timestamp>, name]
-        futures = {executor.submit(IpReader, ip): ip for ip in valid_servers}
-        
-        for future in futures:
-            try:
-                row = future.result()
-                if row:
-                    # row structure from IpReader: [ip, port, map, players, timestamp, server_name]
-                    # We OVERWRITE the timestamp with our unified snapshot timestamp
-                    row[4] = snapshot_dt_str
-                    
-                    # Append snapshot_id
-                    out.append(row + [snapshot_id])
-                else:
-                    ip_tuple = futures[future]
-                    if server_cooldowns.get(ip_tuple, {}).get('skip_until', 0) > time.time():
-                        skipped += 1
-            except Exception as e:
-                logging.error(f"Thread error: {e}")
+    results = asyncio.run(_scan_all(valid_servers))
+
+    scanned = []
+    for ip_tuple, row in zip(valid_servers, results):
+        if isinstance(row, BaseException):
+            logging.error(f"Scan task error: {row}")
+        elif row:
+            scanned.append(row)
+        elif _get_server_cooldown(ip_tuple)['skip_until'] > time.time():
+            skipped += 1
+
+    # Names are cleaned here in one pass per distinct value rather than inside
+    # every query coroutine; most servers share a handful of map names.
+    clean_maps = {m: m.translate(_CTRL_DELETE).strip() for m in {row[2] for row in scanned}}
+    clean_names = {n: sanitize_server_name(n) for n in {row[4] for row in scanned}}
+
+    # Typed write_samples rows: (ip, port, map, players, timestamp, server_name, snapshot_id)
+    out = [
+        (ip_str, port, clean_maps[map_name], players, snapshot_ts, clean_names[server_name], snapshot_id)
+        for ip_str, port, map_name, players, server_name in scanned
+    ]
 
     if skipped > 0:
         logging.info(f"Skipped {skipped} servers in cooldown")
@@ -133,8 +173,6 @@ def scan_loop():
     logging.info("Initializing served cache from existing data...")
     refresh_served_cache()
     
-    last_replica_update_time = time.time()
-
     cycles_count = 0
     
     while True:
@@ -158,23 +196,12 @@ def scan_loop():
             time.sleep(60)
             continue
 
-        # Also scan IPs seen in the DB recently
+        # Also scan IPs seen in the DB recently (DuckDB drops the ones already listed)
         t_start = time.time()
-        recent_ips = get_recent_ips(days=7)
+        recent_ips = get_recent_ips(days=7, exclude=server_list)
         if recent_ips:
-            added_count = 0
-            existing_set = set(server_list)
-            for r_ip, r_port in recent_ips:
-                if (r_ip, r_port) not in existing_set:
-                    try:
-                        server_list.append((r_ip, int(r_port)))
-                        existing_set.add((r_ip, int(r_port)))
-                        added_count += 1
-                    except:
-                        pass
-            
-            if added_count > 0:
-                logging.info(f"Added {added_count} recent servers from DB to the scan list.")
+            server_list.extend(recent_ips)
+            logging.info(f"Added {len(recent_ips)} recent servers from DB to the scan list.")
         timings['add_recent_ips'] = time.time() - t_start
 
         t_start = time.time()
@@ -182,40 +209,36 @@ def scan_loop():
         timings['scan_servers'] = time.time() - t_start
         
         t_start = time.time()
-        record_snapshot(snapshot_id, snapshot_dt_str) # Create snapshot first so FKs work
+        record_snapshot(snapshot_id, snapshot_dt_str) # Queued; written with this cycle's samples
         timings['record_snapshot'] = time.time() - t_start
 
-        t_start = time.time()
-        write_profile = write_samples(results)
-        timings['write_samples'] = time.time() - t_start
-        if write_profile:
-            for key in ('parse', 'df', 'maps', 'servers', 'samples', 'rollups', 'unregister', 'db'):
-                if key in write_profile:
-                    timings[f'write_samples.{key}'] = write_profile[key]
-            timings['write_samples.input_rows'] = write_profile.get('input_rows', len(results))
-            timings['write_samples.parsed_rows'] = write_profile.get('parsed_rows', 0)
+        if results:
+            t_start = time.time()
+            write_profile = write_samples(results)
+            timings['write_samples'] = time.time() - t_start
+            if write_profile:
+                for key in ('parse', 'snaps', 'df', 'maps', 'servers', 'samples', 'rollups', 'unregister', 'db'):
+                    if key in write_profile:
+                        timings[f'write_samples.{key}'] = write_profile[key]
+                timings['write_samples.input_rows'] = write_profile.get('input_rows', len(results))
+                timings['write_samples.parsed_rows'] = write_profile.get('parsed_rows', 0)
 
-        t_start = time.time()
-        save_server_names_to_db(results)
-        timings['save_names'] = time.time() - t_start
+            t_start = time.time()
+            save_server_names_to_db(results)
+            timings['save_names'] = time.time() - t_start
+        else:
+            # Nothing answered; the snapshot is still written so the empty cycle is on record
+            t_start = time.time()
+            flush_snapshots()
+            timings['flush_snapshots'] = time.time() - t_start
         
         t_start = time.time()
-        save_cooldowns_to_db(server_cooldowns)
+        with server_cooldowns_lock:
+            # Entries are mutated in place, so the snapshot copies them too
+            cooldowns_snapshot = {key: cooldown.copy() for key, cooldown in server_cooldowns.items()}
+        save_cooldowns_to_db(cooldowns_snapshot)
         timings['save_cooldowns'] = time.time() - t_start
         
-        t_start = time.time()
-        replica_profile = None
-        if time.time() - last_replica_update_time >= REPLICA_UPDATE_INTERVAL:
-            replica_profile = update_replica_db()
-            last_replica_update_time = time.time()
-        else:
-            logging.info("Replica DB update skipped; live reads use the main DB and backup interval has not elapsed.")
-        timings['update_replica'] = time.time() - t_start
-        if replica_profile:
-            timings['update_replica.copy'] = replica_profile['copy']
-            timings['update_replica.lock_wait'] = replica_profile['lock_wait']
-            timings['update_replica.size_mb'] = replica_profile['size_mb']
-        
         t_start = time.time()
         refresh_served_cache()
         timings['refresh_cache'] = time.time() - t_start
@@ -1,9 +1,17 @@
 import os
+import time
+import socket
+import struct
+import orjson
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
 from dotenv import load_dotenv
 
 from config import BASE_DIR
+from utils import public_ipv4_int
 
 STEAM_API_KEY = os.getenv('STEAM_API_KEY', '')
 GAME_DIR = os.getenv('GAME_DIR', 'tf')  # Default to Team Fortress 2
@@ -14,99 +22,155 @@ if not STEAM_API_KEY:
 
 logging.info(f"Game configured: {GAME_DIR}")
 
+# One keep-alive session for every Steam Web API call, so the per-region
+# requests share a TLS connection instead of handshaking each time
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_SESSION.params = {"key": STEAM_API_KEY}
+_SESSION.headers["User-Agent"] = "SourceMapStats"
+# Advertises br (and zstd) only when a decoder is importable, so with brotli
+# installed the multi-megabyte region responses come over the wire much smaller
+_SESSION.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+
+STEAM_API_HOST = "api.steampowered.com"
+STEAM_SERVER_LIST_URL = f"https://{STEAM_API_HOST}/IGameServersService/GetServerList/v1/"
+
+# Remember the Steam API lookup between scan cycles so a fresh pooled connection
+# does not wait on the resolver; other hosts go straight to the real resolver
+DNS_CACHE_TTL = 300
+_dns_cache = {}
+_real_getaddrinfo = socket.getaddrinfo
+
+def _cached_getaddrinfo(host, *args, **kwargs):
+    if host != STEAM_API_HOST:
+        return _real_getaddrinfo(host, *args, **kwargs)
+    key = (args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    cached = _dns_cache.get(key)
+    if cached and now - cached[0] < DNS_CACHE_TTL:
+        return cached[1]
+    result = _real_getaddrinfo(host, *args, **kwargs)
+    _dns_cache[key] = (now, result)
+    return result
+
+socket.getaddrinfo = _cached_getaddrinfo
+
+# Map game shortname to app ID
+GAME_APPIDS = {
+    "tf": 440,      # Team Fortress 2
+    "csgo": 730,    # CS:GO
+    "cs2": 730,     # CS2
+    "cstrike": 10,  # Counter-Strike 1.6
+    "dod": 30,      # Day of Defeat
+    "hl2dm": 320,   # Half-Life 2: Deathmatch
+    "l4d": 500,     # Left 4 Dead
+    "l4d2": 550,    # Left 4 Dead 2
+}
+
+# Query by different regions to bypass the ~10k limit per request
+REGIONS = [
+    ("us", "\\region\\0"),   # US East
+    ("usw", "\\region\\1"),  # US West  
+    ("sa", "\\region\\2"),   # South America
+    ("eu", "\\region\\3"),   # Europe
+    ("asia", "\\region\\4"), # Asia
+    ("au", "\\region\\5"),   # Australia
+    ("me", "\\region\\6"),   # Middle East
+    ("af", "\\region\\7"),   # Africa
+    ("world", ""),           # Unfiltered (catches any missed)
+]
+
+# One worker per region so every request is in flight at once, however few CPUs
+# the default executor was sized for
+_REGION_EXECUTOR = ThreadPoolExecutor(max_workers=len(REGIONS), thread_name_prefix="steam-api")
+
+_pack_ipv4 = struct.Struct("!I").pack
+
+def _parse_servers(servers, appid, game_lower, _to_ip_int=public_ipv4_int):
+    """Returns every listed server that is really running our game, packed as ip << 16 | port."""
+    # appid, game_lower and the bound helpers are all fast locals in the loop below
+    found = []
+    append = found.append
+    for server in servers:
+        # Only add if it matches our game (double-check the API filter worked);
+        # the integer appid check settles almost every row without touching gamedir
+        if server.get("appid") != appid and server.get("gamedir", "").lower() != game_lower:
+            continue
+        
+        ip, sep, port = server.get("addr", "").rpartition(":")
+        # Skip invalid/link-local IPs at the source
+        ip_int = _to_ip_int(ip) if sep else None
+        if ip_int is None:
+            continue
+        try:
+            port = int(port)
+        except ValueError:
+            continue
+        if 0 <= port <= 0xFFFF:
+            append(ip_int << 16 | port)
+    return found
+
+def _unpack_server(key):
+    return socket.inet_ntoa(_pack_ipv4(key >> 16)), key & 0xFFFF
+
+def _fetch_region(region_name, filter_str, appid, game_lower, timeout):
+    """Fetches one region's packed servers, or [] if the request failed."""
+    try:
+        params = {
+            "filter": filter_str,
+            "limit": 20000  # Request max allowed
+        }
+        response = _SESSION.get(STEAM_SERVER_LIST_URL, params=params, timeout=timeout)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+    except requests.exceptions.Timeout:
+        logging.warning(f"Steam API request timed out for region {region_name}")
+        return []
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+        logging.warning(f"Failed to fetch servers for region {region_name}: {e}")
+        return []
+    # Reduce to packed addresses in the worker, so each region's full JSON is freed
+    # as soon as it is read instead of all nine being held until the merge
+    return _parse_servers(data.get("response", {}).get("servers", []), appid, game_lower)
+
+def _fetch_all_regions(appid, game, timeout):
+    """Runs the per-region requests concurrently; results come back in REGIONS order."""
+    # Use both appid AND gamedir filters for reliable game filtering
+    futures = [
+        _REGION_EXECUTOR.submit(_fetch_region, region_name,
+                                f"\\appid\\{appid}\\gamedir\\{game}{region_filter}", appid, game.lower(), timeout)
+        for region_name, region_filter in REGIONS
+    ]
+    # _fetch_region handles its own errors, so result() only waits
+    return [future.result() for future in futures]
+
 def get_server_list(game=None, timeout=60):
     """Fetches the server list from the Steam Web API."""
-    from utils import is_valid_public_ip
-    
     # Use env variable if no game specified
     if game is None:
         game = GAME_DIR
     
-    all_servers = set()  # Use set to auto-deduplicate
+    # Use set to auto-deduplicate; one int per server hashes and stores far
+    # cheaper than an (ip, port) tuple holding its own string
+    all_servers = set()
     
     if not STEAM_API_KEY:
         logging.error("STEAM_API_KEY not found in .env file. Server scanning disabled.")
         return []
     
     try:
-        # Map game shortname to app ID
-        game_appids = {
-            "tf": 440,      # Team Fortress 2
-            "csgo": 730,    # CS:GO
-            "cs2": 730,     # CS2
-            "cstrike": 10,  # Counter-Strike 1.6
-            "dod": 30,      # Day of Defeat
-            "hl2dm": 320,   # Half-Life 2: Deathmatch
-            "l4d": 500,     # Left 4 Dead
-            "l4d2": 550,    # Left 4 Dead 2
-        }
-        
-        appid = game_appids.get(game, 440)  # Default to TF2
-        
-        # Steam Web API endpoint for game servers
-        url = "https://api.steampowered.com/IGameServersService/GetServerList/v1/"
+        appid = GAME_APPIDS.get(game, 440)  # Default to TF2
         
-        # Query by different regions to bypass the ~10k limit per request
-        regions = [
-            ("us", "\\region\\0"),   # US East
-            ("usw", "\\region\\1"),  # US West  
-            ("sa", "\\region\\2"),   # South America
-            ("eu", "\\region\\3"),   # Europe
-            ("asia", "\\region\\4"), # Asia
-            ("au", "\\region\\5"),   # Australia
-            ("me", "\\region\\6"),   # Middle East
-            ("af", "\\region\\7"),   # Africa
-            ("world", ""),           # Unfiltered (catches any missed)
-        ]
+        # Regions are independent, so total wait is the slowest region rather than the sum
+        region_results = _fetch_all_regions(appid, game, timeout)
         
-        for region_name, region_filter in regions:
-            try:
-                # Use both appid AND gamedir filters for reliable game filtering
-                filter_str = f"\\appid\\{appid}\\gamedir\\{game}{region_filter}"
-                params = {
-                    "key": STEAM_API_KEY,
-                    "filter": filter_str,
-                    "limit": 20000  # Request max allowed
-                }
-                
-                response = requests.get(url, params=params, timeout=timeout)
-                response.raise_for_status()
-                
-                data = response.json()
-                servers = data.get("response", {}).get("servers", [])
-                
-                region_count = 0
-                for server in servers:
-                    # Validate that server is for the correct game
-                    server_appid = server.get("appid", 0)
-                    server_gamedir = server.get("gamedir", "")
-                    
-                    # Only add if it matches our game (double-check the API filter worked)
-                    if server_appid != appid and server_gamedir.lower() != game.lower():
-                        continue
-                    
-                    addr = server.get("addr", "")
-                    if ":" in addr:
-                        ip, port = addr.rsplit(":", 1)
-                        # Skip invalid/link-local IPs at the source
-                        if not is_valid_public_ip(ip):
-                            continue
-                        try:
-                            all_servers.add((ip, int(port)))
-                            region_count += 1
-                        except ValueError:
-                            continue
-                
-                logging.debug(f"Region {region_name}: found {region_count} {game} servers")
-                
-            except requests.exceptions.Timeout:
-                logging.warning(f"Steam API request timed out for region {region_name}")
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Failed to fetch servers for region {region_name}: {e}")
+        for (region_name, _), found in zip(REGIONS, region_results):
+            all_servers.update(found)
+            logging.debug(f"Region {region_name}: found {len(found)} {game} servers")
         
         logging.info(f"Fetched {len(all_servers)} unique servers from Steam Web API (across all regions).")
         
     except Exception as e:
         logging.error(f"Failed to fetch server list from Steam Web API: {e}")
     
-    return list(all_servers)
+    return [_unpack_server(key) for key in all_servers]
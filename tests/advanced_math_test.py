@@ -7,8 +7,11 @@ import shutil
 import duckdb
 import pandas as pd
 import numpy as np
+try:
+    import pyarrow as pa  # optional: lets the samples go in as zero-copy Arrow columns
+except ImportError:
+    pa = None
 from datetime import datetime, timedelta
-import random
 import unittest
 from unittest.mock import patch
 import tempfile
@@ -26,19 +29,26 @@ MINUTES_PER_SNAPSHOT = 5
 
 # Generate 15 Servers
 SERVERS = [f"192.168.0.{i}:27015" for i in range(1, 16)]
+SERVER_IPS = [server.split(':')[0] for server in SERVERS]
+SERVER_PORTS = [int(server.split(':')[1]) for server in SERVERS]
 
 # Generate 15 Maps with varied profiles
 base_maps = ['cp_dustbowl', 'ctf_2fort', 'pl_upward', 'koth_harvest', 'pl_badwater', 
              'cp_gorge', 'koth_viaduct', 'plr_hightower', 'cp_steel', 'ctf_turbine',
              'cp_granary', 'pl_thundermountain', 'cp_process', 'cp_gullywash', 'koth_lakeside']
 
-MAP_PROFILES = {}
-for m in base_maps:
-    # Randomize popularity and player counts
-    avg = random.randint(4, 32)
-    var = random.randint(1, int(avg/2)) if avg > 2 else 0
-    prob = round(random.uniform(0.1, 0.9), 2)
-    MAP_PROFILES[m] = {'prob': prob, 'avg_players': avg, 'variance': var}
+# Fixed seed so a failing run can be reproduced exactly
+MOCK_SEED = 0xC0FFEE
+
+# Randomize popularity and player counts (one vector draw per property)
+_profile_rng = np.random.default_rng(MOCK_SEED)
+_avg = _profile_rng.integers(4, 33, size=len(base_maps))
+_var = _profile_rng.integers(1, _avg // 2 + 1)
+_prob = np.round(_profile_rng.uniform(0.1, 0.9, size=len(base_maps)), 2)
+MAP_PROFILES = {
+    m: {'prob': float(prob), 'avg_players': int(avg), 'variance': int(var)}
+    for m, avg, var, prob in zip(base_maps, _avg, _var, _prob)
+}
 
 MAPS = list(MAP_PROFILES.keys())
 
@@ -49,7 +59,7 @@ assert len(MAPS) >= 10
 # DEFAULT START DATE (Fixed for repeatable tests, but overridable)
 FIXED_START_DATE = datetime(2024, 1, 1)
 
-def generate_mock_data(con, start_date=FIXED_START_DATE):
+def generate_mock_data(con, start_date=FIXED_START_DATE, seed=MOCK_SEED):
     """
     Generates mock data into the given duckdb connection.
     Returns:
@@ -58,140 +68,160 @@ def generate_mock_data(con, start_date=FIXED_START_DATE):
        day_snapshot_counts: dict { date_str -> int(num_snapshots) }
     """
     print(f"Generating mock data starting from {start_date.date()}...")
-    samples = []
+    rng = np.random.default_rng(seed)
     
-    ground_truth = {} 
-    server_ground_truth = {}
-    day_snapshot_counts = {}
+    # We simulate exactly SNAPSHOTS_PER_DAY snapshots for each day
+    date_strs = pd.date_range(start_date, periods=DAYS, freq='D').strftime('%Y-%m-%d').to_numpy()
+    day_snapshot_counts = dict.fromkeys(date_strs, SNAPSHOTS_PER_DAY)
 
-    snapshot_rows = []
+    snapshot_times = pd.date_range(start_date, periods=DAYS * SNAPSHOTS_PER_DAY, freq=f'{MINUTES_PER_SNAPSHOT}min')
+    snapshot_ids = snapshot_times.strftime('%Y%m%d%H%M%S').to_numpy()
+    df_snaps = pd.DataFrame({'snapshot_id': snapshot_ids, 'timestamp': snapshot_times})
 
-    for day_offset in range(DAYS):
-        current_date = start_date + timedelta(days=day_offset)
-        date_str = current_date.strftime('%Y-%m-%d')
+    # Draw every (snapshot, server) cell at once: each server picks a random map,
+    # and is active with that map's probability
+    map_prob = np.array([MAP_PROFILES[m]['prob'] for m in MAPS])
+    map_avg = np.array([MAP_PROFILES[m]['avg_players'] for m in MAPS])
+    map_var = np.array([MAP_PROFILES[m]['variance'] for m in MAPS])
 
-        
-        # We simulate exactly SNAPSHOTS_PER_DAY snapshots for this day
-        day_snapshot_counts[date_str] = SNAPSHOTS_PER_DAY
-        
-        for snap_idx in range(SNAPSHOTS_PER_DAY):
-            snapshot_time = current_date + timedelta(minutes=snap_idx * MINUTES_PER_SNAPSHOT)
-            snapshot_id = snapshot_time.strftime('%Y%m%d%H%M%S')
-            
-            # buffer snapshot for batch insert
-            snapshot_rows.append((snapshot_id, snapshot_time))
-            
-            # For each server, decide what map is playing
-            for server in SERVERS:
-                ip, port = server.split(':')
-                
-                # Pick a random map
-                map_name = random.choice(MAPS)
-                profile = MAP_PROFILES[map_name]
-                
-                # Decide if the server is active
-                if random.random() < profile['prob']:
-                    # It's active
-                    base_players = profile['avg_players']
-                    variance = random.randint(-profile['variance'], profile['variance'])
-                    players = max(0, base_players + variance)
-                    
-                    samples.append((
-                        ip, int(port), map_name, players, snapshot_time, 'US', snapshot_id
-                    ))
-                    
-                    # Update Map Stats
-                    key = (date_str, map_name)
-                    if key not in ground_truth:
-                        ground_truth[key] = 0
-                    ground_truth[key] += players
-
-                    # Update Server Stats
-                    srv_key = (date_str, server)
-                    if srv_key not in server_ground_truth:
-                        server_ground_truth[srv_key] = 0
-                    server_ground_truth[srv_key] += players
-            
-    print(f"Generated {len(samples)} sample rows.")
-    print(f"Batch inserting {len(snapshot_rows)} snapshots (via Pandas)...")
+    shape = (len(snapshot_times), len(SERVERS))
+    map_idx = rng.integers(0, len(MAPS), size=shape)
+    active = rng.random(shape) < map_prob[map_idx]
+
+    # Keep only the active cells, then vary players around each map's average
+    snap_idx, server_idx = np.nonzero(active)
+    map_idx = map_idx[snap_idx, server_idx]
+    variance = map_var[map_idx]
+    players = np.maximum(0, map_avg[map_idx] + rng.integers(-variance, variance + 1))
+
+    # Ground truth is a plain sum of players per (day, map) and per (day, server)
+    df_truth = pd.DataFrame({
+        'date': date_strs[snap_idx // SNAPSHOTS_PER_DAY],
+        'map_name': np.array(MAPS)[map_idx],
+        'server': np.array(SERVERS)[server_idx],
+        'players': players,
+    })
+    ground_truth = df_truth.groupby(['date', 'map_name'], sort=False)['players'].sum().to_dict()
+    server_ground_truth = df_truth.groupby(['date', 'server'], sort=False)['players'].sum().to_dict()
+            
+    print(f"Generated {len(df_truth)} sample rows.")
+    print(f"Batch inserting {len(df_snaps)} snapshots (via Pandas)...")
     
-    # Use Pandas for super-fast insertion
-    df_snaps = pd.DataFrame(snapshot_rows, columns=['snapshot_id', 'timestamp'])
+    # The dimension tables are tiny; insert them and read back their ids
     con.register('df_snaps_view', df_snaps)
     con.execute("INSERT OR IGNORE INTO snaps (guid, timestamp) SELECT snapshot_id as guid, timestamp FROM df_snaps_view")
     con.unregister('df_snaps_view')
-    
-    print("Batch inserting samples (via Pandas)...")
-    df_samples = pd.DataFrame(samples, columns=['ip', 'port', 'map_name', 'players', 'timestamp', 'region', 'snapshot_id'])
-    con.register('df_samples_view', df_samples)
-    # We need to map sever/map names to IDs first for samples_v2
-    con.execute("INSERT OR IGNORE INTO servers (ip, port) SELECT DISTINCT ip, port FROM df_samples_view")
-    con.execute("INSERT OR IGNORE INTO maps (name) SELECT DISTINCT map_name FROM df_samples_view")
-    
-    con.execute("""
-        INSERT INTO samples_v2 (snapshot_id, server_id, map_id, players)
-        SELECT 
-            sn.id,
-            s.id,
-            m.id,
-            df.players
-        FROM df_samples_view df
-        JOIN snaps sn ON df.snapshot_id = sn.guid
-        JOIN servers s ON df.ip = s.ip AND df.port = s.port
-        JOIN maps m ON df.map_name = m.name
-    """)
-    con.unregister('df_samples_view')
+
+    con.executemany("INSERT OR IGNORE INTO servers (ip, port) VALUES (?, ?)", list(zip(SERVER_IPS, SERVER_PORTS)))
+    con.executemany("INSERT OR IGNORE INTO maps (name) VALUES (?)", [[m] for m in MAPS])
+
+    snap_ids = dict(con.execute("SELECT guid, id FROM snaps").fetchall())
+    server_ids = {(ip, port): id_ for id_, ip, port in con.execute("SELECT id, ip, port FROM servers").fetchall()}
+    map_ids = dict(con.execute("SELECT name, id FROM maps").fetchall())
+
+    # With the ids known up front the fact rows are plain integers, so they go
+    # straight in instead of a join against string keys.
+    # int32 matches the INTEGER columns, so nothing is narrowed on the way in.
+    sample_columns = {
+        'snapshot_id': np.array([snap_ids[guid] for guid in snapshot_ids], dtype=np.int32)[snap_idx],
+        'server_id': np.array([server_ids[key] for key in zip(SERVER_IPS, SERVER_PORTS)], dtype=np.int32)[server_idx],
+        'map_id': np.array([map_ids[m] for m in MAPS], dtype=np.int32)[map_idx],
+        'players': players.astype(np.int32),
+    }
+    print(f"Batch inserting samples (via {'Arrow' if pa is not None else 'Appender'})...")
+    append_samples(con, sample_columns)
     
     return ground_truth, server_ground_truth, day_snapshot_counts
 
 
+def append_samples(con, sample_columns):
+    """
+    Appends int32 samples_v2 columns in a single insert.
+    With pyarrow the numpy buffers are wrapped as they are; a DataFrame would
+    first copy them into one consolidated block.
+    """
+    if pa is not None:
+        con.from_arrow(pa.table(sample_columns)).insert_into('samples_v2')
+    else:
+        con.append('samples_v2', pd.DataFrame(sample_columns))
+
+
+def insert_samples(con, samples):
+    """
+    Inserts hand-built (ip, port, map_name, players, timestamp) rows for the edge-case tests.
+    Every distinct timestamp becomes one snapshot, its guid formatted in one vectorized pass.
+    """
+    ips, ports, map_names, players, timestamps = zip(*samples)
+    timestamps = pd.DatetimeIndex(timestamps)
+    guids = timestamps.strftime('%Y%m%d%H%M%S').tolist()
+    servers = list(zip(ips, ports))
+
+    # Only the handful of distinct dimension rows go through SQL
+    con.executemany("INSERT OR IGNORE INTO snaps (guid, timestamp) VALUES (?, ?)", list(dict(zip(guids, timestamps.to_pydatetime())).items()))
+    con.executemany("INSERT OR IGNORE INTO servers (ip, port) VALUES (?, ?)", list(dict.fromkeys(servers)))
+    con.executemany("INSERT OR IGNORE INTO maps (name) VALUES (?)", [[m] for m in dict.fromkeys(map_names)])
+
+    snap_ids = dict(con.execute("SELECT guid, id FROM snaps").fetchall())
+    server_ids = {(ip, port): id_ for id_, ip, port in con.execute("SELECT id, ip, port FROM servers").fetchall()}
+    map_ids = dict(con.execute("SELECT name, id FROM maps").fetchall())
+
+    # The fact rows are then plain integers and are appended as they are,
+    # without a view or a join against the string keys
+    append_samples(con, {
+        'snapshot_id': np.array([snap_ids[guid] for guid in guids], dtype=np.int32),
+        'server_id': np.array([server_ids[key] for key in servers], dtype=np.int32),
+        'map_id': np.array([map_ids[m] for m in map_names], dtype=np.int32),
+        'players': np.array(players, dtype=np.int32),
+    })
+
+def top_k_overlap(expected, actual, k):
+    """Counts how many of the first k entries of `expected` also appear in the first k of `actual`."""
+    return int(np.isin(expected[:k], actual[:k]).sum())
+
 class TestAdvancedMath(unittest.TestCase):
     
     VISUALIZE_MODE = False
     
-    def setUp(self):
-        if self.VISUALIZE_MODE:
+    @classmethod
+    def setUpClass(cls):
+        # The mock month is only read by the tests, so it is generated once per class
+        if cls.VISUALIZE_MODE:
              # Use REAL database paths
              import database
              BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-             self.db_path = os.path.join(BASE_DIR, "sourcemapstats.duckdb")
-             self.replica_path = os.path.join(BASE_DIR, "sourcemapstats_replica.duckdb")
+             cls.template_path = os.path.join(BASE_DIR, "sourcemapstats.duckdb")
              
              # We assume database.py is already pointing to these, but explicit is good
              # We DO NOT patch them, we just use them.
              
              # For visualization, we want recent dates so it shows up in the UI default view
              now = datetime.now()
-             self.start_date = datetime(now.year, now.month, now.day) - timedelta(days=DAYS - 1)
+             cls.start_date = datetime(now.year, now.month, now.day) - timedelta(days=DAYS - 1)
              
              # We assume existing DB structure is fine.
              # We probably want to wipe old test data if this is run multiple times?
              # For now, let's just insert. If snapshot IDs collide (unlikely with timestamps), Replace handles it.
              
         else:
-            # Create a temp dir for our DB file
-            self.test_dir = tempfile.mkdtemp()
-            self.db_path = os.path.join(self.test_dir, "test_sourcemapstats.duckdb")
-            self.replica_path = os.path.join(self.test_dir, "test_sourcemapstats_replica.duckdb")
-            
-            # Patch the paths in database.py
-            import database
-            self.orig_db_file = database.DB_FILE
-            self.orig_replica_file = database.DB_REPLICA_FILE
-            
-            database.DB_FILE = self.db_path
-            database.DB_REPLICA_FILE = self.replica_path
+            # Create a temp dir for our DB files; the mock month is built once into a
+            # template that each test copies, so no test sees another's writes
+            cls.test_dir = tempfile.mkdtemp()
+            cls.template_path = os.path.join(cls.test_dir, "template_sourcemapstats.duckdb")
             
-            self.start_date = FIXED_START_DATE
+            cls.start_date = FIXED_START_DATE
             
             # Initialize the DB logic
-            database.init_db(self.db_path)
+            import database
+            database.init_db(cls.template_path)
         
-        # Populate with Mock Data
-        # Connect to the DB path we decided on
-        with duckdb.connect(self.db_path) as con:
-            if self.VISUALIZE_MODE:
-                print(f"!!! WRITING MOCK DATA TO LIVE DATABASE: {self.db_path} !!!")
+        # Populate with Mock Data through database.py's own connection, so the
+        # ingest does not open a second handle on the file
+        import database
+        cls.orig_db_file = database.DB_FILE
+        database.DB_FILE = cls.template_path
+        with database._cursor() as con:
+            if cls.VISUALIZE_MODE:
+                print(f"!!! WRITING MOCK DATA TO LIVE DATABASE: {cls.template_path} !!!")
                 print("!!! CLEARING EXISTING DATA FOR CLEAN VISUALIZATION !!!")
                 con.execute("DELETE FROM samples")
                 con.execute("DELETE FROM snapshots")
@@ -199,25 +229,34 @@ class TestAdvancedMath(unittest.TestCase):
                 # But to be safe for "stats", samples/snapshots is what matters.
                 pass
 
-            self.ground_truth, self.server_ground_truth, self.day_snapshot_counts = generate_mock_data(con, self.start_date)
-            
-        # Ensure replica is updated
+            cls.ground_truth, cls.server_ground_truth, cls.day_snapshot_counts = generate_mock_data(con, cls.start_date)
+            # Fold the WAL into the file so a plain file copy carries all the data
+            con.execute("CHECKPOINT")
+
+    @classmethod
+    def tearDownClass(cls):
         import database
-        database.update_replica_db()
-        
-        # Force cache clear logic if needed
-        database.g_chart_data_cache.clear()
-        
-    def tearDown(self):
-        if self.VISUALIZE_MODE:
+        database.close_connection()
+        database.DB_FILE = cls.orig_db_file
+        if cls.VISUALIZE_MODE:
             # Do NOT delete the live DB
             pass
         else:
-            import database
-            database.DB_FILE = self.orig_db_file
-            database.DB_REPLICA_FILE = self.orig_replica_file
-            shutil.rmtree(self.test_dir)
+            shutil.rmtree(cls.test_dir)
 
+    def setUp(self):
+        import database
+        
+        if self.VISUALIZE_MODE:
+            self.db_path = self.template_path
+        else:
+            self.db_path = os.path.join(self.test_dir, f"{self._testMethodName}.duckdb")
+            shutil.copyfile(self.template_path, self.db_path)
+            database.DB_FILE = self.db_path
+        
+        # Force cache clear logic if needed
+        database.g_chart_data_cache.clear()
+        
     def test_end_to_end_math_parity(self):
         import database
         
@@ -243,6 +282,10 @@ class TestAdvancedMath(unittest.TestCase):
         # Check Labels (Dates)
         self.assertTrue(len(result['labels']) >= DAYS, "Should return at least the requested days")
         
+        # Labels are 2-hour buckets ('YYYY-MM-DDTHH:MM:SS'); the days they cover are
+        # worked out once and shared by the checks below
+        result_days = sorted({label[:10] for label in result['labels']})
+        
         # Verify Map Datasets
         # result['datasets'] is a list of dicts: { label: map_name, data: [pct1, pct2...], ... }
         # Note: The 'data' in 'datasets' is PERCENTAGE share.
@@ -266,57 +309,56 @@ class TestAdvancedMath(unittest.TestCase):
         server_datasets = result['totalPlayersServerDatasets']
         failures = 0
         
-        # Map date strings to indices
-        date_map = {d: i for i, d in enumerate(result['labels'])}
-        
-        for ds in server_datasets:
-            server_name = ds['label'] # ip:port or Name
-            data_points = ds['data']
-            
-            if server_name == 'Other': continue
-            
-            # The label might have been resolved to a name, but our mock data has raw IPs.
-            # In mock data generate, we didn't put names in 'server_names' table.
-            # So labels should still be 'ip:port'.
-            
-            for date_str, expected_total_players in self.server_ground_truth.items():
-                # ground truth key is (date, server)
-                if date_str not in date_map: continue
-                
-                gt_date, gt_server = date_str, server_name
-                # Only check if this dataset matches the ground truth entry
-                # We have to reverse search the ground truth for this server?
-                # Faster: iterate the dataset's days
-                pass
-            
-        # Let's iterate the ground truth and find it in the result
-        for (date_str, server_name), total_players in self.server_ground_truth.items():
-            if date_str not in date_map:
-                # Might be out of range if we generated more than requested? 
-                # We requested all DAYS.
-                continue
-                
-            idx = date_map[date_str]
-            day_snaps = self.day_snapshot_counts.get(date_str, 1) # Should be 24
-            
-            expected_avg = total_players / day_snaps
-            
-            # Find in result
-            found = False
-            for ds in server_datasets:
-                if ds['label'] == server_name:
-                    actual = ds['data'][idx]
-                    found = True
-                    if abs(actual - expected_avg) > 0.05: # Allow some float/rounding slop (precision=2 in app)
-                        print(f"FAIL Server {server_name} on {date_str}: Expected {expected_avg:.3f}, Got {actual}")
-                        failures += 1
-                    break
-            
-            if not found and expected_avg > 0.01:
-                # If it's not in the top list, it might be in 'Other' or we requested too few?
-                # We requested 100 servers.
+        # The label might have been resolved to a name, but our mock data has raw IPs.
+        # In mock data generate, we didn't put names in 'server_names' table.
+        # So labels should still be 'ip:port'.
+        data_by_server = {ds['label']: ds['data'] for ds in server_datasets if ds['label'] != 'Other'}
+            
+        # Let the ground truth and the result meet in one DuckDB join instead of
+        # scanning the datasets for every (day, server) pair. The chart is bucketed
+        # every 2 hours and each day has the same number of snapshots per bucket,
+        # so a day's average is the mean of its buckets.
+        df_expected = pd.DataFrame(
+            [(date_str, server_name, total_players / self.day_snapshot_counts.get(date_str, 1))
+             for (date_str, server_name), total_players in self.server_ground_truth.items()],
+            columns=['date', 'server', 'expected_avg'],
+        )
+        df_actual = pd.DataFrame(
+            [(server_name, bucket, value)
+             for server_name, data_points in data_by_server.items()
+             for bucket, value in zip(result['labels'], data_points)],
+            columns=['label', 'bucket', 'value'],
+        )
+        df_days = pd.DataFrame({'date': result_days})
+        
+        with duckdb.connect() as check_con:
+            check_con.register('expected', df_expected)
+            check_con.register('actual', df_actual)
+            check_con.register('result_days', df_days)
+            # Days outside the returned labels are skipped; a server missing from the
+            # output only counts if it should have had players that day
+            # (allow some float/rounding slop, precision=2 in app)
+            mismatches = check_con.execute("""
+                WITH daily AS (
+                    SELECT label, left(bucket, 10) AS date, avg(value) AS actual
+                    FROM actual
+                    GROUP BY ALL
+                )
+                SELECT e.date, e.server, e.expected_avg, d.actual
+                FROM expected e
+                SEMI JOIN result_days r ON e.date = r.date
+                LEFT JOIN daily d ON d.label = e.server AND d.date = e.date
+                WHERE (d.actual IS NULL AND e.expected_avg > 0.01)
+                   OR abs(d.actual - e.expected_avg) > 0.05
+                ORDER BY e.date, e.server
+            """).fetchall()
+        
+        for date_str, server_name, expected_avg, actual in mismatches:
+            if actual is None:
                 print(f"FAIL Server {server_name} missing from output on {date_str} (Expected {expected_avg})")
-                failures += 1
+            else:
+                print(f"FAIL Server {server_name} on {date_str}: Expected {expected_avg:.3f}, Got {actual}")
+        failures += len(mismatches)
                 
         if failures == 0:
             print("Server stats verified successfully against ground truth!")
@@ -356,11 +398,8 @@ class TestAdvancedMath(unittest.TestCase):
         
         # Calculate expected ranking from ground truth
         # Sum all players for each map across all days
-        map_total_players = {}
-        for (date_str, map_name), total_players in self.ground_truth.items():
-            if map_name not in map_total_players:
-                map_total_players[map_name] = 0
-            map_total_players[map_name] += total_players
+        # (also reused by the generator realism check below)
+        map_total_players = pd.Series(self.ground_truth).groupby(level=1).sum().to_dict()
         
         # Sort by total contribution (descending)
         expected_ranking_order = sorted(map_total_players.keys(), 
@@ -373,17 +412,14 @@ class TestAdvancedMath(unittest.TestCase):
         # Verify top maps match (allowing for small differences due to 2h bucketing vs daily)
         # At minimum, the top 5 should be the same (possibly in slightly different order due to bucketing)
         top_n = min(5, len(expected_ranking_order), len(actual_ranking_order))
-        expected_top = set(expected_ranking_order[:top_n])
-        actual_top = set(actual_ranking_order[:top_n])
-        
-        overlap = len(expected_top.intersection(actual_top))
+        overlap = top_k_overlap(expected_ranking_order, actual_ranking_order, top_n)
         print(f"Top {top_n} expected: {expected_ranking_order[:top_n]}")
         print(f"Top {top_n} actual:   {actual_ranking_order[:top_n]}")
         print(f"Overlap: {overlap}/{top_n}")
         
         # Allow at most 1 difference in top 5 due to bucketing differences
         self.assertGreaterEqual(overlap, top_n - 1, 
-            f"Ranking should be based on total contribution. Expected {expected_top}, got {actual_top}")
+            f"Ranking should be based on total contribution. Expected {expected_ranking_order[:top_n]}, got {actual_ranking_order[:top_n]}")
         
         # 3. Verify Generator Realism (Statistical Check)
         print("\nVerifying Generator Realism...")
@@ -395,9 +431,9 @@ class TestAdvancedMath(unittest.TestCase):
         #   (Num_Servers * Prob * Avg_Players) * (1/Num_Maps ?? No, independent)
         # Wait, the logic is:
         # for server in SERVERS:
-        #    map = random.choice(MAPS) (Uniform selection of map!)
+        #    map = MAPS[rng.integers(len(MAPS))] (Uniform selection of map!)
         #    profile = MAP_PROFILES[map]
-        #    if random() < profile['prob']: add players
+        #    if rng.random() < profile['prob']: add players
         
         # So Expected Global Avg players for Map M = 
         #   Num_Servers * P(Server picks Map M) * P(Server active | Map M) * Avg_Players
@@ -418,10 +454,7 @@ class TestAdvancedMath(unittest.TestCase):
             
             # Calculate Actual from Ground Truth
             # ground_truth[(date, map)] = total_players_for_day
-            total_players_all_time = sum(
-                self.ground_truth.get((d, map_name), 0) 
-                for d in self.day_snapshot_counts
-            )
+            total_players_all_time = map_total_players.get(map_name, 0)
             actual_avg = total_players_all_time / total_snapshots
             
             # Allow margin of error (e.g. +/- 20% + small epsilon) due to randomness
@@ -456,20 +489,16 @@ class TestAdvancedMath(unittest.TestCase):
         # Create a fresh temp DB for this specific test
         test_dir = tempfile.mkdtemp()
         db_path = os.path.join(test_dir, "edge_test.duckdb")
-        replica_path = os.path.join(test_dir, "edge_test_replica.duckdb")
         
         orig_db = database.DB_FILE
-        orig_replica = database.DB_REPLICA_FILE
         
         try:
             database.DB_FILE = db_path
-            database.DB_REPLICA_FILE = replica_path
             database.init_db(db_path)
             
             # Create controlled test data
-            with duckdb.connect(db_path) as con:
+            with database._cursor() as con:
                 samples = []
-                snapshot_rows = []
                 
                 start_date = datetime(2024, 1, 1)
                 days = 30
@@ -486,48 +515,22 @@ class TestAdvancedMath(unittest.TestCase):
                     
                     for snap_idx in range(snapshots_per_day):
                         snapshot_time = current_date + timedelta(hours=snap_idx * 2)
-                        snapshot_id = snapshot_time.strftime('%Y%m%d%H%M%S')
-                        snapshot_rows.append((snapshot_id, snapshot_time))
                         
                         # Consistent map: always 10 players
                         samples.append((
                             '10.0.0.1', 27015, 'consistent_map', 10, 
-                            snapshot_time, 'US', snapshot_id
+                            snapshot_time
                         ))
                         
                         # Spike map: 100 players ONLY on day 15
                         if day_offset == 14:  # Day 15 (0-indexed)
                             samples.append((
                                 '10.0.0.1', 27015, 'spike_map', 100, 
-                                snapshot_time, 'US', snapshot_id
+                                snapshot_time
                             ))
                 
-                # Insert data
-                df_snaps = pd.DataFrame(snapshot_rows, columns=['snapshot_id', 'timestamp'])
-                # guid is expected by normalized schema
-                df_snaps['guid'] = df_snaps['snapshot_id']
-                con.register('df_snaps_view', df_snaps)
-                con.execute("INSERT OR IGNORE INTO snaps (guid, timestamp) SELECT guid, timestamp FROM df_snaps_view")
-                con.unregister('df_snaps_view')
-                
-                df_samples = pd.DataFrame(samples, columns=['ip', 'port', 'map_name', 'players', 'timestamp', 'region', 'snapshot_id'])
-                con.register('df_samples_view', df_samples)
-                
-                # Normalize via SQL
-                con.execute("INSERT OR IGNORE INTO servers (ip, port) SELECT DISTINCT ip, port FROM df_samples_view")
-                con.execute("INSERT OR IGNORE INTO maps (name) SELECT DISTINCT map_name FROM df_samples_view")
-                con.execute("""
-                    INSERT INTO samples_v2 (snapshot_id, server_id, map_id, players)
-                    SELECT sn.id, s.id, m.id, df.players
-                    FROM df_samples_view df
-                    JOIN snaps sn ON df.snapshot_id = sn.guid
-                    JOIN servers s ON df.ip = s.ip AND df.port = s.port
-                    JOIN maps m ON df.map_name = m.name
-                """)
-                con.unregister('df_samples_view')
-            
-            # Update replica
-            database.update_replica_db()
+                insert_samples(con, samples)
+            
             database.g_chart_data_cache.clear()
             
             # Query the data
@@ -566,8 +569,8 @@ class TestAdvancedMath(unittest.TestCase):
             print("Edge case test PASSED: Sum-based ranking correctly prioritizes consistent popularity over single-day spikes!")
             
         finally:
+            database.close_connection()
             database.DB_FILE = orig_db
-            database.DB_REPLICA_FILE = orig_replica
             shutil.rmtree(test_dir)
 
     def test_gaps_in_data_ignored_for_server_ranking(self):
@@ -583,20 +586,16 @@ class TestAdvancedMath(unittest.TestCase):
         # Create a fresh temp DB for this specific test
         test_dir = tempfile.mkdtemp()
         db_path = os.path.join(test_dir, "gap_test.duckdb")
-        replica_path = os.path.join(test_dir, "gap_test_replica.duckdb")
         
         orig_db = database.DB_FILE
-        orig_replica = database.DB_REPLICA_FILE
         
         try:
             database.DB_FILE = db_path
-            database.DB_REPLICA_FILE = replica_path
             database.init_db(db_path)
             
             # Create controlled test data with gaps
-            with duckdb.connect(db_path) as con:
+            with database._cursor() as con:
                 samples = []
-                snapshot_rows = []
                 
                 start_date = datetime(2024, 1, 1)
                 days = 10
@@ -610,39 +609,15 @@ class TestAdvancedMath(unittest.TestCase):
                     
                     for snap_idx in range(snapshots_per_day):
                         snapshot_time = current_date + timedelta(hours=snap_idx * 2)
-                        snapshot_id = snapshot_time.strftime('%Y%m%d%H%M%S')
-                        snapshot_rows.append((snapshot_id, snapshot_time))
                         
                         # Server has 10 players on each day with data
                         samples.append((
                             '10.0.0.1', 27015, 'test_map', 10, 
-                            snapshot_time, 'US', snapshot_id
+                            snapshot_time
                         ))
                 
-                # Insert data
-                df_snaps = pd.DataFrame(snapshot_rows, columns=['snapshot_id', 'timestamp'])
-                df_snaps['guid'] = df_snaps['snapshot_id']
-                con.register('df_snaps_view', df_snaps)
-                con.execute("INSERT OR IGNORE INTO snaps (guid, timestamp) SELECT guid, timestamp FROM df_snaps_view")
-                con.unregister('df_snaps_view')
-                
-                df_samples = pd.DataFrame(samples, columns=['ip', 'port', 'map_name', 'players', 'timestamp', 'region', 'snapshot_id'])
-                con.register('df_samples_view', df_samples)
-                
-                con.execute("INSERT OR IGNORE INTO servers (ip, port) SELECT DISTINCT ip, port FROM df_samples_view")
-                con.execute("INSERT OR IGNORE INTO maps (name) SELECT DISTINCT map_name FROM df_samples_view")
-                con.execute("""
-                    INSERT INTO samples_v2 (snapshot_id, server_id, map_id, players)
-                    SELECT sn.id, s.id, m.id, df.players
-                    FROM df_samples_view df
-                    JOIN snaps sn ON df.snapshot_id = sn.guid
-                    JOIN servers s ON df.ip = s.ip AND df.port = s.port
-                    JOIN maps m ON df.map_name = m.name
-                """)
-                con.unregister('df_samples_view')
-            
-            # Update replica
-            database.update_replica_db()
+                insert_samples(con, samples)
+            
             database.g_chart_data_cache.clear()
             
             # Query the data for the full 10-day range
@@ -692,8 +667,8 @@ class TestAdvancedMath(unittest.TestCase):
                 self.fail("Server 10.0.0.1:27015 not found in server ranking")
             
         finally:
+            database.close_connection()
             database.DB_FILE = orig_db
-            database.DB_REPLICA_FILE = orig_replica
             shutil.rmtree(test_dir)
 
     def test_unequal_snapshot_counts_weighted_equally(self):
@@ -709,68 +684,27 @@ class TestAdvancedMath(unittest.TestCase):
         # Create a fresh temp DB for this specific test
         test_dir = tempfile.mkdtemp()
         db_path = os.path.join(test_dir, "weight_test.duckdb")
-        replica_path = os.path.join(test_dir, "weight_test_replica.duckdb")
         
         orig_db = database.DB_FILE
-        orig_replica = database.DB_REPLICA_FILE
         
         try:
             database.DB_FILE = db_path
-            database.DB_REPLICA_FILE = replica_path
             database.init_db(db_path)
             
-            with duckdb.connect(db_path) as con:
-                samples = []
-                snapshot_rows = []
-                
+            with database._cursor() as con:
                 start_date = datetime(2024, 1, 1)
                 
                 # Day 1: 100 snapshots, 10 players each = 1000 total, avg = 10
-                day1 = start_date
-                for snap_idx in range(100):
-                    snapshot_time = day1 + timedelta(minutes=snap_idx * 5)
-                    snapshot_id = snapshot_time.strftime('%Y%m%d%H%M%S')
-                    snapshot_rows.append((snapshot_id, snapshot_time))
-                    samples.append((
-                        '10.0.0.1', 27015, 'test_map', 10, 
-                        snapshot_time, 'US', snapshot_id
-                    ))
+                day1_times = pd.date_range(start_date, periods=100, freq='5min')
                 
                 # Day 2: 10 snapshots, 10 players each = 100 total, avg = 10
-                day2 = start_date + timedelta(days=1)
-                for snap_idx in range(10):
-                    snapshot_time = day2 + timedelta(minutes=snap_idx * 30)
-                    snapshot_id = snapshot_time.strftime('%Y%m%d%H%M%S')
-                    snapshot_rows.append((snapshot_id, snapshot_time))
-                    samples.append((
-                        '10.0.0.1', 27015, 'test_map', 10, 
-                        snapshot_time, 'US', snapshot_id
-                    ))
-                
-                # Insert data
-                df_snaps = pd.DataFrame(snapshot_rows, columns=['snapshot_id', 'timestamp'])
-                df_snaps['guid'] = df_snaps['snapshot_id']
-                con.register('df_snaps_view', df_snaps)
-                con.execute("INSERT OR IGNORE INTO snaps (guid, timestamp) SELECT guid, timestamp FROM df_snaps_view")
-                con.unregister('df_snaps_view')
+                day2_times = pd.date_range(start_date + timedelta(days=1), periods=10, freq='30min')
                 
-                df_samples = pd.DataFrame(samples, columns=['ip', 'port', 'map_name', 'players', 'timestamp', 'region', 'snapshot_id'])
-                con.register('df_samples_view', df_samples)
-                
-                con.execute("INSERT OR IGNORE INTO servers (ip, port) SELECT DISTINCT ip, port FROM df_samples_view")
-                con.execute("INSERT OR IGNORE INTO maps (name) SELECT DISTINCT map_name FROM df_samples_view")
-                con.execute("""
-                    INSERT INTO samples_v2 (snapshot_id, server_id, map_id, players)
-                    SELECT sn.id, s.id, m.id, df.players
-                    FROM df_samples_view df
-                    JOIN snaps sn ON df.snapshot_id = sn.guid
-                    JOIN servers s ON df.ip = s.ip AND df.port = s.port
-                    JOIN maps m ON df.map_name = m.name
-                """)
-                con.unregister('df_samples_view')
-            
-            # Update replica
-            database.update_replica_db()
+                insert_samples(con, [
+                    ('10.0.0.1', 27015, 'test_map', 10, snapshot_time)
+                    for snapshot_time in day1_times.append(day2_times)
+                ])
+            
             database.g_chart_data_cache.clear()
             
             # Query the data
@@ -819,8 +753,8 @@ class TestAdvancedMath(unittest.TestCase):
                 self.fail("Server 10.0.0.1:27015 not found in server ranking")
             
         finally:
+            database.close_connection()
             database.DB_FILE = orig_db
-            database.DB_REPLICA_FILE = orig_replica
             shutil.rmtree(test_dir)
 
 if __name__ == "__main__":
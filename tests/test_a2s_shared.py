@@ -0,0 +1,156 @@
+import asyncio
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from a2s.a2s_async import A2SSharedSocket, HEADER_MULTI, HEADER_SIMPLE, request_async_impl
+from a2s.defaults import DEFAULT_ENCODING
+from a2s.info import InfoProtocol
+
+with patch("database.load_cooldowns_from_db", return_value={}):
+    import scanner  # keep the module-level cooldown load off the live DB
+
+
+def info_response(map_name, player_count):
+    return (
+        b"\x49\x11"
+        + b"Fake Server\0" + map_name.encode() + b"\0" + b"tf\0" + b"Team Fortress\0"
+        + (440).to_bytes(2, "little")
+        + bytes([player_count, 24, 0]) + b"dl\x00\x01"
+        + b"1.0\0"
+    )
+
+
+class FakeA2SServer(asyncio.DatagramProtocol):
+    """Answers A2S_INFO, optionally demanding a challenge or splitting the reply in two fragments."""
+    CHALLENGE = 0x12345678
+
+    def __init__(self, map_name, player_count, challenge=False, fragmented=False):
+        self.map_name = map_name
+        self.player_count = player_count
+        self.challenge = challenge
+        self.fragmented = fragmented
+        self.requests = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, packet, addr):
+        self.requests += 1
+        query = HEADER_SIMPLE + InfoProtocol.serialize_request(0)
+        if self.challenge and packet == query:
+            self.transport.sendto(HEADER_SIMPLE + b"\x41" + self.CHALLENGE.to_bytes(4, "little"), addr)
+            return
+        if self.challenge and packet != HEADER_SIMPLE + InfoProtocol.serialize_request(self.CHALLENGE):
+            return
+        payload = HEADER_SIMPLE + info_response(self.map_name, self.player_count)
+        if not self.fragmented:
+            self.transport.sendto(payload, addr)
+            return
+        half = len(payload) // 2
+        for fragment_id, part in ((1, payload[half:]), (0, payload[:half])):
+            header = (7).to_bytes(4, "little") + bytes([2, fragment_id]) + (1248).to_bytes(2, "little")
+            self.transport.sendto(HEADER_MULTI + header + part, addr)
+
+
+class TestSharedSocket(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.loop = asyncio.get_running_loop()
+        self.endpoints = []
+
+    async def asyncTearDown(self):
+        for transport in self.endpoints:
+            transport.close()
+
+    async def start_server(self, protocol):
+        transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: protocol, local_addr=("127.0.0.1", 0))
+        self.endpoints.append(transport)
+        return transport.get_extra_info("sockname")[:2]
+
+    async def query(self, shared, address, timeout=1.0):
+        conn = shared.stream(address, timeout)
+        try:
+            return await request_async_impl(conn, DEFAULT_ENCODING, InfoProtocol)
+        finally:
+            conn.close()
+
+    async def test_replies_are_routed_by_source_address(self):
+        servers = {}
+        for i in range(10):
+            protocol = FakeA2SServer(f"map_{i}", i, challenge=i % 2 == 1, fragmented=i == 4)
+            servers[await self.start_server(protocol)] = protocol
+
+        shared = await A2SSharedSocket.create()
+        try:
+            results = await asyncio.gather(*(self.query(shared, address) for address in servers))
+        finally:
+            shared.close()
+
+        for address, info in zip(servers, results):
+            self.assertEqual(info.map_name, servers[address].map_name)
+            self.assertEqual(info.player_count, servers[address].player_count)
+        self.assertEqual(shared.routes, {})
+
+    async def test_challenge_is_retried(self):
+        protocol = FakeA2SServer("cp_dustbowl", 12, challenge=True)
+        address = await self.start_server(protocol)
+
+        shared = await A2SSharedSocket.create()
+        try:
+            info = await self.query(shared, address)
+        finally:
+            shared.close()
+
+        self.assertEqual(info.map_name, "cp_dustbowl")
+        self.assertEqual(protocol.requests, 2)
+
+    async def test_timeout_puts_server_in_cooldown(self):
+        address = await self.start_server(asyncio.DatagramProtocol())  # never answers
+
+        shared = await A2SSharedSocket.create()
+        with patch.dict(scanner.server_cooldowns, clear=True):
+            scanner._set_server_cooldown(address, 0.2, 0, 0)
+            try:
+                row = await scanner.IpReaderAsync(address, asyncio.Semaphore(1), shared)
+            finally:
+                shared.close()
+            cooldown = scanner.server_cooldowns[address]
+
+        self.assertIsNone(row)
+        self.assertEqual(cooldown['failures'], 1)
+        self.assertGreater(cooldown['skip_until'], time.time())
+        self.assertEqual(shared.routes, {})
+
+    async def test_scanner_row_from_shared_socket(self):
+        address = await self.start_server(FakeA2SServer("pl_upward\r\n", 7))
+
+        shared = await A2SSharedSocket.create()
+        with patch.dict(scanner.server_cooldowns, clear=True):
+            try:
+                row = await scanner.IpReaderAsync(address, asyncio.Semaphore(1), shared)
+            finally:
+                shared.close()
+
+        # Names come back raw; IpReaderMulti cleans them after the scan
+        self.assertEqual(row, (address[0], address[1], "pl_upward\r\n", 7, "Fake Server"))
+        self.assertEqual(shared.routes, {})
+
+
+class TestIpReaderMulti(unittest.TestCase):
+    def test_rows_are_cleaned_and_stamped(self):
+        async def fake_scan(servers):
+            return [("1.2.3.4", 27015, "pl_upward\r\n", 7, "\u2588 Fake\x01 Server "), None]
+
+        with patch("scanner._scan_all", side_effect=fake_scan), patch.dict(scanner.server_cooldowns, clear=True):
+            out = scanner.IpReaderMulti(
+                [("1.2.3.4", 27015), ("5.6.7.8", 27015)], "20240101100000", "2024-01-01-10:00:00")
+
+        self.assertEqual(out, [
+            ("1.2.3.4", 27015, "pl_upward", 7, datetime(2024, 1, 1, 10), "Fake Server", "20240101100000"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
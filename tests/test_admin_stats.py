@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+import routes
+import utils
+
+
+class TestAdminStats(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        app = Flask(__name__)
+        app.register_blueprint(routes.bp)
+        cls.client = app.test_client()
+
+        cls.test_dir = tempfile.mkdtemp()
+        cls.patches = [
+            patch("utils.ADMIN_DB_FILE", os.path.join(cls.test_dir, "admin_stats.duckdb")),
+            patch("utils.ADMIN_IPS", {"127.0.0.1"}),
+        ]
+        for p in cls.patches:
+            p.start()
+        utils.init_admin_db()
+
+    @classmethod
+    def tearDownClass(cls):
+        with utils._admin_con_lock:
+            utils._close_admin_connection_locked()
+        for p in cls.patches:
+            p.stop()
+        shutil.rmtree(cls.test_dir)
+
+    def setUp(self):
+        utils.REQUESTS_PER_IP.clear()
+
+    def get_stats(self, remote_addr):
+        return self.client.get("/api/admin/stats", environ_base={"REMOTE_ADDR": remote_addr})
+
+    def test_non_admin_gets_404(self):
+        self.assertEqual(self.get_stats("10.0.0.1").status_code, 404)
+
+    def test_admin_ip_gets_stats(self):
+        resp = self.get_stats("127.0.0.1")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsInstance(resp.get_json(), dict)
+
+    def test_ipv6_localhost_counts_as_admin(self):
+        self.assertEqual(self.get_stats("::1").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import duckdb
+
+import database
+
+
+class TestFetchHelpers(unittest.TestCase):
+    def setUp(self):
+        self.con = duckdb.connect()
+        self.con.execute(
+            "CREATE TABLE t AS SELECT * FROM (VALUES ('1.2.3.4', 27015), ('5.6.7.8', 27016)) v(ip, port)"
+        )
+
+    def tearDown(self):
+        self.con.close()
+
+    def _check_branch(self, has_pyarrow):
+        with patch("database.HAS_PYARROW", has_pyarrow):
+            df = database._fetch_df(self.con.execute("SELECT ip, port FROM t ORDER BY port"))
+            self.assertEqual(list(df.columns), ["ip", "port"])
+            self.assertEqual(df["port"].tolist(), [27015, 27016])
+
+            ips, ports = database._fetch_columns(self.con.execute("SELECT ip, port FROM t ORDER BY port"))
+            self.assertEqual(ips, ["1.2.3.4", "5.6.7.8"])
+            self.assertEqual(ports, [27015, 27016])
+
+            empty = database._fetch_columns(self.con.execute("SELECT ip, port FROM t WHERE false"))
+            self.assertEqual(empty, [[], []])
+
+    @unittest.skipUnless(database.HAS_PYARROW, "pyarrow not installed")
+    def test_arrow_branch(self):
+        self._check_branch(True)
+
+    def test_fallback_branch(self):
+        self._check_branch(False)
+
+
+class TestRecentIps(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.orig_db_file = database.DB_FILE
+        database.DB_FILE = os.path.join(self.test_dir, "test_sourcemapstats.duckdb")
+        database.init_db(database.DB_FILE)
+
+        now = datetime.now()
+        with database._cursor() as con:
+            con.execute("INSERT INTO servers (id, ip, port) VALUES (1, '1.1.1.1', 27015), (2, '2.2.2.2', 27015), (3, '3.3.3.3', 27016)")
+            con.execute("INSERT INTO maps (id, name) VALUES (1, 'cp_dustbowl')")
+            con.execute(
+                "INSERT INTO snaps (id, guid, timestamp) VALUES (1, 'old', ?), (2, 'recent', ?)",
+                [now - timedelta(days=30), now - timedelta(days=1)],
+            )
+            # 3.3.3.3 was only seen in the old snapshot
+            con.execute("INSERT INTO samples_v3 VALUES (1, 3, 1, 5), (2, 1, 1, 10), (2, 2, 1, 20)")
+
+    def tearDown(self):
+        database.close_connection()
+        database.DB_FILE = self.orig_db_file
+        shutil.rmtree(self.test_dir)
+
+    def test_returns_servers_seen_within_window(self):
+        self.assertEqual(
+            sorted(database.get_recent_ips(days=7)),
+            [('1.1.1.1', 27015), ('2.2.2.2', 27015)],
+        )
+
+    def test_excluded_pairs_are_dropped(self):
+        # Only an exact (ip, port) match is excluded
+        recent = database.get_recent_ips(days=7, exclude=[('1.1.1.1', 27015), ('2.2.2.2', 27016)])
+        self.assertEqual(recent, [('2.2.2.2', 27015)])
+
+    def test_everything_excluded_returns_empty(self):
+        recent = database.get_recent_ips(days=7, exclude=[('1.1.1.1', 27015), ('2.2.2.2', 27015)])
+        self.assertEqual(recent, [])
+
+
+class TestCooldownPersistence(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.orig_db_file = database.DB_FILE
+        database.DB_FILE = os.path.join(self.test_dir, "test_sourcemapstats.duckdb")
+        database.init_db(database.DB_FILE)
+
+    def tearDown(self):
+        database.close_connection()
+        database.DB_FILE = self.orig_db_file
+        shutil.rmtree(self.test_dir)
+
+    def test_save_and_load_round_trip(self):
+        cooldowns = {
+            ('1.1.1.1', 27015): {'timeout': 0.5, 'failures': 0, 'skip_until': 0.0},
+            ('2.2.2.2', 27016): {'timeout': 4.0, 'failures': 3, 'skip_until': 1700000000.0},
+        }
+        database.save_cooldowns_to_db(cooldowns)
+        # Saving again replaces rows rather than duplicating them
+        cooldowns[('1.1.1.1', 27015)]['failures'] = 1
+        database.save_cooldowns_to_db(cooldowns)
+
+        self.assertEqual(database.load_cooldowns_from_db(), cooldowns)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+import database
+import routes
+import utils
+
+
+CHART_DATA = {'labels': ['2024-01-01 00:00'], 'datasets': [{'label': 'cp_dustbowl', 'data': [100.0]}]}
+EMPTY_CHART_DATA = {'labels': [], 'datasets': [], 'dailyTotals': [], 'snapshotCounts': [], 'ranking': [], 'shownMapsCount': 0, 'averageDailyPlayerCount': 0}
+
+
+class TestDataRoute(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes.bp)
+        self.client = app.test_client()
+        routes._data_response_cache.clear()
+
+    def tearDown(self):
+        routes._data_response_cache.clear()
+
+    def test_empty_fallback_is_not_cached(self):
+        with patch("routes.get_chart_data", return_value=EMPTY_CHART_DATA):
+            first = self.client.get("/api/data")
+        self.assertEqual(first.get_json()['labels'], [])
+        self.assertIsNone(first.headers.get('ETag'))
+        self.assertIsNone(first.headers.get('Cache-Control'))
+        self.assertEqual(len(routes._data_response_cache), 0)
+
+        # Once the DB recovers, the same URL serves the real chart
+        with patch("routes.get_chart_data", return_value=CHART_DATA) as get_chart_data:
+            second = self.client.get("/api/data")
+        get_chart_data.assert_called_once()
+        self.assertEqual(second.get_json(), CHART_DATA)
+        self.assertEqual(len(routes._data_response_cache), 1)
+
+    def test_if_none_match_returns_304(self):
+        with patch("routes.get_chart_data", return_value=CHART_DATA) as get_chart_data:
+            first = self.client.get("/api/data?days_to_show=7")
+            etag = first.headers['ETag']
+            second = self.client.get("/api/data?days_to_show=7", headers={'If-None-Match': etag})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.headers['ETag'], etag)
+        self.assertEqual(second.data, b'')
+        get_chart_data.assert_called_once()
+
+    def test_etag_changes_after_generation_bump(self):
+        with patch("routes.get_chart_data", return_value=CHART_DATA):
+            etag = self.client.get("/api/data").headers['ETag']
+            with patch("database.g_cache_generation", database.g_cache_generation + 1):
+                bumped = self.client.get("/api/data", headers={'If-None-Match': etag})
+        self.assertEqual(bumped.status_code, 200)
+        self.assertNotEqual(bumped.headers['ETag'], etag)
+        self.assertEqual(bumped.get_json(), CHART_DATA)
+
+    def test_etag_depends_on_params(self):
+        with patch("routes.get_chart_data", return_value=CHART_DATA):
+            etag = self.client.get("/api/data?days_to_show=7").headers['ETag']
+            other = self.client.get("/api/data?days_to_show=14", headers={'If-None-Match': etag})
+        self.assertEqual(other.status_code, 200)
+        self.assertNotEqual(other.headers['ETag'], etag)
+
+    def test_csv_status_stats_db_file_at_most_once_per_ttl(self):
+        routes._db_exists_cache['checked_at'] = float('-inf')
+        real_exists = os.path.exists
+        db_checks = []
+
+        def exists(path):
+            if path == routes.DB_FILE:
+                db_checks.append(path)
+                return True
+            return real_exists(path)
+
+        with patch("routes.os.path.exists", side_effect=exists):
+            for _ in range(3):
+                self.assertTrue(self.client.get("/api/csv_status").get_json()['exists'])
+            self.assertEqual(len(db_checks), 1)
+            with patch("routes.time.monotonic", return_value=time.monotonic() + routes.CSV_STATUS_TTL + 1):
+                self.client.get("/api/csv_status")
+            self.assertEqual(len(db_checks), 2)
+
+
+class TestDebugWhoami(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes.bp)
+        self.client = app.test_client()
+
+    def test_hidden_from_non_admins(self):
+        with patch("utils.is_admin_ip", return_value=False):
+            self.assertEqual(self.client.get("/debug-whoami").status_code, 404)
+
+    def test_reports_only_proxy_headers(self):
+        with patch("utils.is_admin_ip", return_value=True):
+            body = self.client.get("/debug-whoami", headers={"X-Real-IP": "1.2.3.4", "Cookie": "secret"}).get_json()
+        self.assertEqual(set(body["headers"]), set(routes.DEBUG_WHOAMI_HEADERS))
+        self.assertEqual(body["headers"]["X-Real-IP"], "1.2.3.4")
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(routes.bp)
+        self.client = app.test_client()
+        utils.REQUESTS_PER_IP.clear()
+
+    def tearDown(self):
+        utils.REQUESTS_PER_IP.clear()
+
+    def test_requests_over_limit_are_rejected_until_window_passes(self):
+        with patch("utils.MAX_REQ", 3), patch("utils.time.time", return_value=1000.0):
+            statuses = [self.client.get("/api/date_range").status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+        with patch("utils.MAX_REQ", 3), patch("utils.time.time", return_value=1000.0 + utils.WINDOW + 1):
+            response = self.client.get("/api/date_range")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-RateLimit-Remaining"], "2")
+        self.assertEqual(len(utils.REQUESTS_PER_IP["127.0.0.1"]), 1)
+
+    def test_admin_stats_cleanup_runs_on_cleanup_interval(self):
+        with patch("utils.cleanup_old_stats") as cleanup, patch("utils.last_cleanup", time.time()):
+            for _ in range(3):
+                self.client.get("/api/date_range")
+        cleanup.assert_not_called()
+
+        with patch("utils.cleanup_old_stats") as cleanup, patch("utils.last_cleanup", 0):
+            self.client.get("/api/date_range")
+        cleanup.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
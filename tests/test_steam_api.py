@@ -0,0 +1,115 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+import orjson
+import requests
+
+import steam_api
+
+
+class FakeResponse:
+    def __init__(self, servers):
+        self.content = orjson.dumps({"response": {"servers": servers}})
+
+    def raise_for_status(self):
+        pass
+
+
+class GarbledResponse(FakeResponse):
+    def __init__(self):
+        self.content = b"<html>502 Bad Gateway</html>"
+
+
+class TestGetServerList(unittest.TestCase):
+    def fetch(self, responses):
+        """Runs get_server_list with each region answered from `responses` (keyed by region filter suffix)."""
+        def fake_get(url, params, timeout):
+            region = params["filter"].rpartition("\\gamedir\\tf")[2]
+            answer = responses.get(region, [])
+            if isinstance(answer, Exception):
+                raise answer
+            return answer if isinstance(answer, FakeResponse) else FakeResponse(answer)
+
+        with patch("steam_api.STEAM_API_KEY", "key"), patch.object(steam_api._SESSION, "get", side_effect=fake_get) as get:
+            servers = steam_api.get_server_list("tf")
+        return servers, get
+
+    def test_regions_are_merged_and_deduplicated(self):
+        servers, get = self.fetch({
+            "\\region\\0": [{"addr": "1.2.3.4:27015", "appid": 440, "gamedir": "tf"}],
+            "\\region\\3": [{"addr": "5.6.7.8:27016", "appid": 440, "gamedir": "tf"}],
+            "": [
+                {"addr": "1.2.3.4:27015", "appid": 440, "gamedir": "tf"},
+                {"addr": "9.9.9.9:27015", "appid": 0, "gamedir": "TF"},
+            ],
+        })
+        self.assertEqual(get.call_count, len(steam_api.REGIONS))
+        self.assertEqual(sorted(servers), [("1.2.3.4", 27015), ("5.6.7.8", 27016), ("9.9.9.9", 27015)])
+
+    def test_wrong_game_and_bad_addresses_are_dropped(self):
+        servers, _ = self.fetch({"": [
+            {"addr": "1.2.3.4:27015", "appid": 730, "gamedir": "csgo"},
+            {"addr": "169.254.1.1:27015", "appid": 440, "gamedir": "tf"},
+            {"addr": "1.2.3.4:notaport", "appid": 440, "gamedir": "tf"},
+            {"addr": "1.2.3.4:70000", "appid": 440, "gamedir": "tf"},
+            {"addr": "1.2.3.4", "appid": 440, "gamedir": "tf"},
+            {"appid": 440, "gamedir": "tf"},
+            {"addr": "5.6.7.8:27015", "appid": 440, "gamedir": "tf"},
+        ]})
+        self.assertEqual(servers, [("5.6.7.8", 27015)])
+
+    def test_failed_region_does_not_drop_the_others(self):
+        servers, _ = self.fetch({
+            "\\region\\0": requests.exceptions.Timeout(),
+            "\\region\\1": requests.exceptions.ConnectionError("refused"),
+            "\\region\\2": GarbledResponse(),
+            "": [{"addr": "5.6.7.8:27015", "appid": 440, "gamedir": "tf"}],
+        })
+        self.assertEqual(servers, [("5.6.7.8", 27015)])
+
+    def test_regions_are_requested_concurrently(self):
+        # Every region has to be in flight at once for the barrier to open
+        barrier = threading.Barrier(len(steam_api.REGIONS), timeout=5)
+
+        def fake_get(url, params, timeout):
+            barrier.wait()
+            return FakeResponse([{"addr": "5.6.7.8:27015", "appid": 440, "gamedir": "tf"}])
+
+        with patch("steam_api.STEAM_API_KEY", "key"), patch.object(steam_api._SESSION, "get", side_effect=fake_get):
+            self.assertEqual(steam_api.get_server_list("tf"), [("5.6.7.8", 27015)])
+        self.assertFalse(barrier.broken)
+
+    def test_no_api_key_skips_the_request(self):
+        with patch("steam_api.STEAM_API_KEY", ""), patch.object(steam_api._SESSION, "get") as get:
+            self.assertEqual(steam_api.get_server_list("tf"), [])
+        get.assert_not_called()
+
+
+class TestDnsCache(unittest.TestCase):
+    def setUp(self):
+        steam_api._dns_cache.clear()
+
+    def tearDown(self):
+        steam_api._dns_cache.clear()
+
+    def test_steam_host_is_resolved_once_per_ttl(self):
+        addrinfo = [(2, 1, 6, "", ("203.0.113.5", 443))]
+        with patch("steam_api._real_getaddrinfo", return_value=addrinfo) as resolve:
+            for _ in range(3):
+                self.assertEqual(steam_api._cached_getaddrinfo(steam_api.STEAM_API_HOST, 443, 0, 1), addrinfo)
+            self.assertEqual(resolve.call_count, 1)
+            with patch("steam_api.time.monotonic", return_value=steam_api.time.monotonic() + steam_api.DNS_CACHE_TTL + 1):
+                steam_api._cached_getaddrinfo(steam_api.STEAM_API_HOST, 443, 0, 1)
+            self.assertEqual(resolve.call_count, 2)
+
+    def test_other_hosts_are_not_cached(self):
+        with patch("steam_api._real_getaddrinfo", return_value=[]) as resolve:
+            steam_api._cached_getaddrinfo("example.com", 443)
+            steam_api._cached_getaddrinfo("example.com", 443)
+        self.assertEqual(resolve.call_count, 2)
+        self.assertEqual(steam_api._dns_cache, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import utils
+
+
+class TestParseChartParams(unittest.TestCase):
+    def test_defaults(self):
+        params = utils.parse_chart_params({})
+        for name, (_cast, default, _lo, _hi) in utils.CHART_PARAM_SCHEMA.items():
+            self.assertEqual(params[name], default)
+        self.assertEqual(params['server_filter'], 'ALL')
+        self.assertEqual(params['only_maps_containing'], [])
+
+    def test_malformed_values_fall_back_and_others_are_clamped(self):
+        params = utils.parse_chart_params({
+            'days_to_show': 'abc',
+            'maps_to_show': '500',
+            'percision': '-1',
+            'bias_exponent': '2.5',
+            'top_servers': '',
+        })
+        self.assertEqual(params['days_to_show'], 7)
+        self.assertEqual(params['maps_to_show'], 50)
+        self.assertEqual(params['percision'], 0)
+        self.assertEqual(params['bias_exponent'], 2.5)
+        self.assertEqual(params['top_servers'], 10)
+
+    def test_lists_and_filters(self):
+        params = utils.parse_chart_params({
+            'start_date': '2024-01-01',
+            'only_maps_containing': ' cp_, ,koth_',
+            'server_filter': ' 1.2.3.4:27015 ',
+        })
+        self.assertEqual(params['start_date_str'], '2024-01-01')
+        self.assertEqual(params['only_maps_containing'], ['cp_', 'koth_'])
+        self.assertEqual(params['server_filter'], '1.2.3.4:27015')
+
+
+class TestSanitizeServerName(unittest.TestCase):
+    def test_strips_block_and_control_characters(self):
+        self.assertEqual(utils.sanitize_server_name("\u2588\u2588 My Server \u2591\x00\x1b\x7f\x85"), "My Server")
+
+    def test_keeps_other_text(self):
+        self.assertEqual(utils.sanitize_server_name("Café | 24/7 2fort ★"), "Café | 24/7 2fort ★")
+
+    def test_empty_names(self):
+        self.assertEqual(utils.sanitize_server_name(""), "")
+        self.assertEqual(utils.sanitize_server_name(None), "")
+
+
+class TestIsValidPublicIp(unittest.TestCase):
+    def test_public_addresses_pass(self):
+        for ip in ("1.2.3.4", "8.8.8.8", "169.253.255.255", "126.255.255.255", "1.0.0.0",
+                   "11.0.0.1", "172.15.255.255", "172.32.0.1", "192.169.0.1",
+                   "100.63.255.255", "100.128.0.1", "198.20.0.1", "223.255.255.255"):
+            self.assertTrue(utils.is_valid_public_ip(ip), ip)
+
+    def test_reserved_and_malformed_addresses_fail(self):
+        for ip in ("169.254.1.1", "127.0.0.1", "127.255.0.1", "0.0.0.0",
+                   "10.0.0.1", "172.16.0.1", "172.31.255.255", "192.168.1.1",
+                   "224.0.0.1", "239.255.255.250", "240.0.0.1", "255.255.255.255", "0.0.0.1",
+                   "100.64.0.1", "100.127.255.255", "198.18.0.1", "198.19.255.255",
+                   "192.0.0.8", "192.0.2.1", "198.51.100.7", "203.0.113.5",
+                   "256.1.1.1", "1.2.3", "1.2.3.4.5", "01.2.3.4", "1.2.3.4 ", "", "::1", None):
+            self.assertFalse(utils.is_valid_public_ip(ip), ip)
+
+    def test_public_ipv4_int(self):
+        self.assertEqual(utils.public_ipv4_int("1.2.3.4"), 0x01020304)
+        self.assertIsNone(utils.public_ipv4_int("127.0.0.1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
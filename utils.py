@@ -1,9 +1,13 @@
 import os
 import time
 import math
+import socket
+import struct
 import logging
+import threading
 import duckdb
-from functools import wraps
+from collections import defaultdict, deque
+from functools import wraps, lru_cache
 from flask import request, jsonify, g, abort
 from dotenv import load_dotenv
 
@@ -54,8 +58,9 @@ if os.path.exists(GEOIP_DB_PATH):
 else:
     logging.warning(f"GeoIP database not found at '{GEOIP_DB_PATH}'. Country lookups will be disabled.")
 
+@lru_cache(maxsize=65536)
 def get_country(ip: str) -> str:
-    """Looks up the country code for a given IP address."""
+    """Looks up the country code for a given IP address (memoized; servers repeat every scan)."""
     if not geoip_reader:
         return "N/A"
     try:
@@ -67,50 +72,80 @@ def get_country(ip: str) -> str:
         logging.debug(f"Could not get country for IP {ip}: {e}")
         return "N/A"
 
+# Deletion table for C0/DEL/C1 control characters and the Block Elements
+# (U+2580 - U+259F, e.g. '█') in server names
+_NAME_DELETE = dict.fromkeys([*range(0x00, 0x20), *range(0x7F, 0xA0), *range(0x2580, 0x25A0)])
+
 def sanitize_server_name(name: str) -> str:
     """Removes block characters and other noise from server names."""
     if not name:
         return ""
-    import re
-    # Remove block elements (U+2580 - U+259F)
-    # Also remove generic control characters
-    # Case specifically for '█' (U+2588) as requested
-    
-    # Remove all characters in the Block Elements unicode block
-    name = re.sub(r'[\u2580-\u259F]', '', name)
-    
-    # Remove common control characters but keep text
-    name = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', name)
-    
-    # Trim whitespace
-    return name.strip()
+    return name.translate(_NAME_DELETE).strip()
 
 # ─── IP Validation ────────────────────────────────────────────────────────────
+# (mask, network) pairs over the address as a 32-bit integer
+_BLOCKED_IPV4 = (
+    (0xFF000000, 0x00000000),  # 0.0.0.0/8 "this network"
+    (0xFF000000, 0x0A000000),  # 10.0.0.0/8 private
+    (0xFFC00000, 0x64400000),  # 100.64.0.0/10 carrier-grade NAT
+    (0xFF000000, 0x7F000000),  # 127.0.0.0/8 localhost
+    (0xFFFF0000, 0xA9FE0000),  # 169.254.0.0/16 link-local
+    (0xFFF00000, 0xAC100000),  # 172.16.0.0/12 private
+    (0xFFFFFF00, 0xC0000000),  # 192.0.0.0/24 IETF protocol assignments
+    (0xFFFFFF00, 0xC0000200),  # 192.0.2.0/24 TEST-NET-1
+    (0xFFFF0000, 0xC0A80000),  # 192.168.0.0/16 private
+    (0xFFFE0000, 0xC6120000),  # 198.18.0.0/15 benchmarking
+    (0xFFFFFF00, 0xC6336400),  # 198.51.100.0/24 TEST-NET-2
+    (0xFFFFFF00, 0xCB007100),  # 203.0.113.0/24 TEST-NET-3
+    (0xF0000000, 0xE0000000),  # 224.0.0.0/4 multicast
+    (0xF0000000, 0xF0000000),  # 240.0.0.0/4 reserved, incl. 255.255.255.255 broadcast
+)
+_unpack_ipv4 = struct.Struct('!I').unpack
+
+def public_ipv4_int(ip_str):
+    """Returns a public IPv4 address as a 32-bit integer, or None if it is invalid or reserved."""
+    # inet_pton only accepts a strict dotted quad, and the range checks are then
+    # plain integer masks instead of splitting and parsing each octet
+    try:
+        (addr,) = _unpack_ipv4(socket.inet_pton(socket.AF_INET, ip_str))
+    except (OSError, TypeError):
+        return None
+    for mask, network in _BLOCKED_IPV4:
+        if addr & mask == network:
+            return None
+    return addr
+
 def is_valid_public_ip(ip_str):
     """Check if an IP address is a valid public IP (not link-local, private, etc.)."""
-    try:
-        parts = [int(p) for p in ip_str.split('.')]
-        if len(parts) != 4:
-            return False
-        # Filter out link-local (169.254.x.x)
-        if parts[0] == 169 and parts[1] == 254:
-            return False
-        # Filter out localhost
-        if parts[0] == 127:
-            return False
-        # Filter out 0.0.0.0
-        if all(p == 0 for p in parts):
-            return False
-        return True
-    except:
-        return False
+    return public_ipv4_int(ip_str) is not None
 
 # ─── Request Tracking (for Admin Panel) ───────────────────────────────────────
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import re as regex_module
 
 ADMIN_DB_FILE = os.path.join(BASE_DIR, "admin_stats.duckdb")
 
+_admin_con = None
+_admin_con_lock = threading.Lock()
+
+def _admin_cursor():
+    """
+    Return a cursor on the process-wide admin DB connection.
+    track_request runs on every request, so the connection is opened once and
+    kept warm; each caller gets its own cheap, thread-safe cursor.
+    """
+    global _admin_con
+    with _admin_con_lock:
+        if _admin_con is None:
+            _admin_con = duckdb.connect(ADMIN_DB_FILE)
+        return _admin_con.cursor()
+
+def _close_admin_connection_locked():
+    global _admin_con
+    if _admin_con is not None:
+        _admin_con.close()
+    _admin_con = None
+
 # ─── Threat Detection & IP Blocking ───────────────────────────────────────────
 # Patterns that indicate malicious intent
 THREAT_PATTERNS = [
@@ -224,7 +259,7 @@ def block_ip(ip: str, reason: str = "Manual block", auto: bool = False):
     
     # Persist to database
     try:
-        with duckdb.connect(ADMIN_DB_FILE) as con:
+        with _admin_cursor() as con:
             con.execute("""
                 INSERT OR REPLACE INTO blocked_ips (ip, reason, blocked_at, auto_blocked)
                 VALUES (?, ?, ?, ?)
@@ -244,7 +279,7 @@ def unblock_ip(ip: str) -> bool:
     logging.info(f"Unblocked IP: {ip}")
     
     try:
-        with duckdb.connect(ADMIN_DB_FILE) as con:
+        with _admin_cursor() as con:
             con.execute("DELETE FROM blocked_ips WHERE ip = ?", [ip])
     except Exception as e:
         logging.error(f"Failed to remove blocked IP from DB: {e}")
@@ -287,7 +322,7 @@ def record_threat(ip: str, threat_type: str, full_path: str):
 def load_blocked_ips():
     """Load blocked IPs from the database into memory."""
     try:
-        with duckdb.connect(ADMIN_DB_FILE) as con:
+        with _admin_cursor() as con:
             # Check if table exists first
             try:
                 rows = con.execute("SELECT ip, reason, blocked_at, auto_blocked FROM blocked_ips").fetchall()
@@ -306,7 +341,7 @@ def load_blocked_ips():
 
 def init_admin_db():
     try:
-        with duckdb.connect(ADMIN_DB_FILE) as con:
+        with _admin_cursor() as con:
             con.execute("""
                 CREATE TABLE IF NOT EXISTS request_log (
                     id INTEGER PRIMARY KEY,
@@ -354,70 +389,73 @@ def rebuild_admin_db(days_to_keep=30):
     """Rebuilds the admin DB to enforce vacuuming and minimal file size."""
     try:
         logging.info("Starting admin DB rebuild/compaction...")
+        # The shared connection holds the file lock. Keeping _admin_con_lock until
+        # the swap is done makes _admin_cursor() wait for the new file instead of
+        # reopening (and then writing to) the old one.
+        with _admin_con_lock:
+            _close_admin_connection_locked()
         
-        # Temp file path
-        base, ext = os.path.splitext(ADMIN_DB_FILE)
-        temp_file = f"{base}_new{ext}"
+            # Temp file path
+            base, ext = os.path.splitext(ADMIN_DB_FILE)
+            temp_file = f"{base}_new{ext}"
         
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
             
-        cutoff = datetime.now() - timedelta(days=days_to_keep)
+            cutoff = datetime.now() - timedelta(days=days_to_keep)
         
-        # 1. Open new DB and create schema
-        with duckdb.connect(temp_file) as con_new:
-            con_new.execute("""
-                CREATE TABLE request_log (
-                    id INTEGER PRIMARY KEY,
-                    timestamp TIMESTAMP,
-                    ip TEXT,
-                    endpoint TEXT,
-                    full_path TEXT
-                );
-                CREATE SEQUENCE seq_req_id START 1;
+            # 1. Open new DB and create schema
+            with duckdb.connect(temp_file) as con_new:
+                con_new.execute("""
+                    CREATE TABLE request_log (
+                        id INTEGER PRIMARY KEY,
+                        timestamp TIMESTAMP,
+                        ip TEXT,
+                        endpoint TEXT,
+                        full_path TEXT
+                    );
+                    CREATE SEQUENCE seq_req_id START 1;
                 
-                CREATE TABLE blocked_ips (
-                    ip TEXT PRIMARY KEY,
-                    reason TEXT,
-                    blocked_at TIMESTAMP,
-                    auto_blocked BOOLEAN
-                );
-            """)
-            
-            # 2. Attach old DB and copy valid data
-            con_new.execute(f"ATTACH '{ADMIN_DB_FILE}' AS old_db")
+                    CREATE TABLE blocked_ips (
+                        ip TEXT PRIMARY KEY,
+                        reason TEXT,
+                        blocked_at TIMESTAMP,
+                        auto_blocked BOOLEAN
+                    );
+                """)
             
-            # Copy request_log data newer than cutoff
-            con_new.execute("""
-                INSERT INTO request_log 
-                SELECT * FROM old_db.request_log 
-                WHERE timestamp >= ?
-            """, [cutoff])
+                # 2. Attach old DB and copy valid data
+                con_new.execute(f"ATTACH '{ADMIN_DB_FILE}' AS old_db")
             
-            # Copy all blocked IPs (no time cutoff for blocks)
-            try:
+                # Copy request_log data newer than cutoff
                 con_new.execute("""
-                    INSERT INTO blocked_ips 
-                    SELECT * FROM old_db.blocked_ips
-                """)
-            except:
-                pass  # Table might not exist in old DB
+                    INSERT INTO request_log 
+                    SELECT * FROM old_db.request_log 
+                    WHERE timestamp >= ?
+                """, [cutoff])
             
-            copied_count = con_new.execute("SELECT count(*) FROM request_log").fetchone()[0]
+                # Copy all blocked IPs (no time cutoff for blocks)
+                try:
+                    con_new.execute("""
+                        INSERT INTO blocked_ips 
+                        SELECT * FROM old_db.blocked_ips
+                    """)
+                except:
+                    pass  # Table might not exist in old DB
             
-            # Reset sequence
-            max_id = con_new.execute("SELECT max(id) FROM request_log").fetchone()[0] or 0
-            con_new.execute(f"DROP SEQUENCE IF EXISTS seq_req_id")
-            con_new.execute(f"CREATE SEQUENCE seq_req_id START {max_id + 1}")
+                copied_count = con_new.execute("SELECT count(*) FROM request_log").fetchone()[0]
             
-            con_new.execute("DETACH old_db")
+                # Reset sequence
+                max_id = con_new.execute("SELECT max(id) FROM request_log").fetchone()[0] or 0
+                con_new.execute(f"DROP SEQUENCE IF EXISTS seq_req_id")
+                con_new.execute(f"CREATE SEQUENCE seq_req_id START {max_id + 1}")
             
-        # 3. Swap files
-        # Small race condition possible here if a write happens exactly now, 
-        # but admin stats are tolerant of minor loss (and scanning is single threaded usually)
-        import shutil
-        shutil.move(temp_file, ADMIN_DB_FILE)
-        logging.info(f"Admin DB rebuild complete. Retained {copied_count} rows.")
+                con_new.execute("DETACH old_db")
+            
+            # 3. Swap files
+            import shutil
+            shutil.move(temp_file, ADMIN_DB_FILE)
+            logging.info(f"Admin DB rebuild complete. Retained {copied_count} rows.")
         
     except Exception as e:
         logging.error(f"Failed to rebuild admin DB: {e}")
@@ -436,7 +474,7 @@ def track_request(ip: str, endpoint: str):
             full_path = endpoint
 
         now = datetime.now()
-        with duckdb.connect(ADMIN_DB_FILE) as con:
+        with _admin_cursor() as con:
             con.execute(
                 "INSERT INTO request_log (id, timestamp, ip, endpoint, full_path) VALUES (nextval('seq_req_id'), ?, ?, ?, ?)",
                 [now, ip, endpoint, full_path]
@@ -454,7 +492,7 @@ def get_request_stats(page=1, limit=50, date_filter=None):
         today = datetime.now().strftime('%Y-%m-%d')
         target_date = date_filter if date_filter else today
         
-        with duckdb.connect(ADMIN_DB_FILE, read_only=True) as con:
+        with _admin_cursor() as con:
             # 1. Total Unique IPs (for pagination)
             total_ips = con.execute(
                 "SELECT count(DISTINCT ip) FROM request_log WHERE strftime('%Y-%m-%d', timestamp) = ?",
@@ -581,7 +619,8 @@ def cleanup_old_stats(days_to_keep=30):
     last_admin_cleanup = now
 
 # ─── Rate Limiting ────────────────────────────────────────────────────────────
-REQUESTS_PER_IP = {}
+REQUESTS_PER_IP = defaultdict(deque)  # ip -> deque of request timestamps (oldest first)
+REQUESTS_PER_IP_LOCK = threading.Lock()
 MAX_REQ = 60
 WINDOW = 15
 CLEANUP_INTERVAL = 60
@@ -617,41 +656,38 @@ def rate_limiter(fn):
         
         # Periodic cleanup of old entries to prevent memory leak
         now = time.time()
+        cutoff = now - WINDOW
         if now - last_cleanup > CLEANUP_INTERVAL:
-            keys_to_delete = []
-            for k, lst in REQUESTS_PER_IP.items():
-                # Remove timestamps older than WINDOW
-                valid_timestamps = [t for t in lst if t > now - WINDOW]
-                if not valid_timestamps:
-                    keys_to_delete.append(k)
-                else:
-                    REQUESTS_PER_IP[k] = valid_timestamps
-            
-            for k in keys_to_delete:
-                del REQUESTS_PER_IP[k]
-            last_cleanup = now
+            with REQUESTS_PER_IP_LOCK:
+                # Timestamps are appended in order, so an IP is idle once its newest
+                # one is out of the window; live deques are trimmed on their next request
+                # instead of being rebuilt here.
+                idle = [k for k, lst in REQUESTS_PER_IP.items() if not lst or lst[-1] <= cutoff]
+                for k in idle:
+                    del REQUESTS_PER_IP[k]
+                last_cleanup = now
+            # Old admin stats are swept on the same cadence rather than per request
+            cleanup_old_stats()
 
         endpoint = request.endpoint or request.path
         
         # Track request for admin statistics
         track_request(ip, endpoint)
         
-        # Also cleanup old stats periodically
-        cleanup_old_stats()
-        
-        lst = REQUESTS_PER_IP.setdefault(ip, [])
-        
-        # drop timestamps older than WINDOW
-        while lst and lst[0] <= now - WINDOW:
-            lst.pop(0)
-            
-        if len(lst) >= MAX_REQ:
-            retry = int(WINDOW - (now - lst[0]))
-            return jsonify({"error":"Too many requests","cooldown":retry}), 429
+        with REQUESTS_PER_IP_LOCK:
+            lst = REQUESTS_PER_IP[ip]
             
-        lst.append(now)
-        g.rate_remaining = MAX_REQ - len(lst)
-        g.rate_reset = int(WINDOW - (now - lst[0]))
+            # drop timestamps older than WINDOW
+            while lst and lst[0] <= cutoff:
+                lst.popleft()
+                
+            if len(lst) >= MAX_REQ:
+                retry = int(WINDOW - (now - lst[0]))
+                return jsonify({"error":"Too many requests","cooldown":retry}), 429
+                
+            lst.append(now)
+            g.rate_remaining = MAX_REQ - len(lst)
+            g.rate_reset = int(WINDOW - (now - lst[0]))
         r = fn(*args, **kwargs)
         
         # Ensure it's a response object before checking headers. 
@@ -680,77 +716,45 @@ def get_color(i: int, total: int, intensity: int) -> str:
     return f"rgb({r},{g},{b})"
 
 # ─── Chart Data Helpers ───────────────────────────────────────────────────────
+# Numeric chart params: name -> (type, default, min, max). Missing or malformed
+# values fall back to the default; everything else is clamped to the range to
+# protect the server.
+CHART_PARAM_SCHEMA = {
+    'days_to_show': (int, 7, 1, 365),
+    'maps_to_show': (int, 10, 1, 50),
+    'percision': (int, 2, 0, 6),
+    'color_intensity': (int, 50, 1, 50),
+    'bias_exponent': (float, 1.2, 0.1, 8.0),
+    'top_servers': (int, 10, 1, 50),
+}
+
+def _arg_list(request_args, name):
+    return [s.strip() for s in request_args.get(name, '').split(',') if s.strip()]
+
 def parse_chart_params(request_args) -> dict:
     """
     Parses and sanitizes chart data parameters from a request object (or dict).
     Returns a dictionary of cleaned parameters ready for get_chart_data.
     """
-    from datetime import datetime, timezone, timedelta
-
-    # Helper to parse days_to_show early for calculating default start_date
-    def _get_days():
-        try:
-            return max(1, min(365, int(request_args.get('days_to_show', 7))))
-        except Exception:
-            return 7
-    
-    days = _get_days()
-    # Default start_date should show the last N days ENDING at today, not starting today
-    today_dt = datetime.now(timezone.utc)
-    default_start = (today_dt - timedelta(days=days - 1)).strftime('%Y-%m-%d')
-    start_date_str = request_args.get('start_date', default_start)
-    
-    # Clamp numeric inputs to reasonable ranges to protect the server.
-    def _to_int(name, default):
-        try:
-            return int(request_args.get(name, default))
-        except Exception:
-            return default
-    def _to_float(name, default):
+    params = {}
+    for name, (cast, default, lo, hi) in CHART_PARAM_SCHEMA.items():
+        value = request_args.get(name)
         try:
-            return float(request_args.get(name, default))
-        except Exception:
-            return default
-
-    days_to_show = _to_int('days_to_show', 7)
-    maps_to_show = _to_int('maps_to_show', 10)
-    percision = _to_int('percision', 2)
-    color_intensity = _to_int('color_intensity', 50)
-    bias_exponent = _to_float('bias_exponent', 1.2)
+            params[name] = default if value is None else max(lo, min(hi, cast(value)))
+        except (TypeError, ValueError):
+            params[name] = default
 
-    only_maps_containing_str = request_args.get('only_maps_containing', '')
-    only_maps_containing = [s.strip() for s in only_maps_containing_str.split(',') if s.strip()]
-
-    append_maps_containing_str = request_args.get('append_maps_containing', '')
-    append_maps_containing = [s.strip() for s in append_maps_containing_str.split(',') if s.strip()]
+    # Default start_date should show the last N days ENDING at today, not starting today
+    start_date_str = request_args.get('start_date')
+    if start_date_str is None:
+        start_date_str = (datetime.now(timezone.utc) - timedelta(days=params['days_to_show'] - 1)).strftime('%Y-%m-%d')
+    params['start_date_str'] = start_date_str
 
-    top_servers = _to_int('top_servers', 10)
+    params['only_maps_containing'] = _arg_list(request_args, 'only_maps_containing')
+    params['append_maps_containing'] = _arg_list(request_args, 'append_maps_containing')
+    params['only_servers_containing'] = _arg_list(request_args, 'only_servers_containing')
 
     # Server filter: 'ALL' or 'IP:PORT'
-    server_filter = request_args.get('server_filter', 'ALL').strip() or 'ALL'
-
-    only_servers_containing_str = request_args.get('only_servers_containing', '')
-    only_servers_containing = [s.strip() for s in only_servers_containing_str.split(',') if s.strip()]
-
-    # Apply clamping
-    days_to_show = max(1, min(365, days_to_show))
-    maps_to_show = max(1, min(50, maps_to_show))
-    percision = max(0, min(6, percision))
-    color_intensity = max(1, min(50, color_intensity))
-    bias_exponent = max(0.1, min(8.0, bias_exponent))
-    top_servers = max(1, min(50, top_servers))
-
-    return {
-        'start_date_str': start_date_str,
-        'days_to_show': days_to_show,
-        'maps_to_show': maps_to_show,
-        'percision': percision,
-        'color_intensity': color_intensity,
-        'bias_exponent': bias_exponent,
-        'only_maps_containing': only_maps_containing,
-        'append_maps_containing': append_maps_containing,
-        'top_servers': top_servers,
-        'server_filter': server_filter,
-        'only_servers_containing': only_servers_containing
-    }
+    params['server_filter'] = request_args.get('server_filter', 'ALL').strip() or 'ALL'
+    return params
 